@@ -1,4 +1,4 @@
-from blastimation.blast import blast_get_format_id
+from blastimation.blast import Blast, blast_get_format_id
 from blastimation.comp import Composite, CompType
 
 
@@ -8,39 +8,39 @@ class AnimationComp:
         self.comps: list[Composite] = []
         self.type = CompType.AnimationComp
 
-    def blast(self):
-        return self.comps[0].blast()
+        # Aggregates of the frames, filled by update
+        self.blast: Blast = Blast.BLAST0
+        self.width: int = 0
+        self.height: int = 0
+        self.lut: int = 0
+        self.encoded_size: int = 0
+        self.decoded_size: int = 0
 
-    def start(self):
-        return self.comps[0].start()
-
-    def width(self):
-        return self.comps[0].width()
-
-    def height(self):
-        return self.comps[0].height()
-
-    def encoded_size(self):
-        size = 0
+    # Aggregates of the frames, their composites are updated as well
+    def update(self):
         for c in self.comps:
-            size += c.encoded_size()
-        return size
+            c.update()
+        first = self.comps[0]
+        self.blast = first.blast
+        self.width = first.width
+        self.height = first.height
+        self.lut = first.lut
+        self.encoded_size = sum(c.encoded_size for c in self.comps)
+        self.decoded_size = sum(c.decoded_size for c in self.comps)
 
-    def decoded_size(self):
-        size = 0
-        for c in self.comps:
-            size += c.decoded_size()
-        return size
+    def start(self):
+        return self.comps[0].start()
 
     def frames(self):
         return len(self.comps)
 
-    def lut(self):
-        return self.comps[0].lut()
-
     def set_lut(self, lut: int):
         for c in self.comps:
             c.set_lut(lut)
+        self.update()
+
+    def get_frame(self, frame: int):
+        return self.comps[frame].get_image()
 
     def get_image(self):
         return self.comps[0].get_image()
@@ -49,12 +49,12 @@ class AnimationComp:
         return [
             "0x%06X" % self.start(),
             self.name,
-            self.blast().name,
-            blast_get_format_id(self.blast()),
-            self.width(),
-            self.height(),
-            self.encoded_size(),
-            self.decoded_size(),
+            self.blast.name,
+            blast_get_format_id(self.blast),
+            self.width,
+            self.height,
+            self.encoded_size,
+            self.decoded_size,
             self.type.name,
             self.frames()
         ]
@@ -1,19 +1,39 @@
 import sys
 import threading
+import zlib
 
-from PySide6.QtCore import QRect, Qt, QSortFilterProxyModel, QSize, QEvent, QTimer
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon
+import numpy as np
+from PySide6.QtCore import QRect, Qt, QSize, QEvent, QTimer, Signal
+from PySide6.QtGui import QStandardItemModel, QStandardItem, QImage, QPixmap
 from PySide6.QtWidgets import QHBoxLayout, QLabel, QPushButton, QSizePolicy, QVBoxLayout, QWidget, \
     QListView, QComboBox, QTabWidget, QTreeView, QToolButton, QStyle, QStackedWidget
 
+from blastimation.cache import MemoryCache, ThumbnailKey, decode_cache, memory_cache, thumbnail_cache
 from blastimation.comp import CompType
-from blastimation.lut import luts
+from blastimation.filter import Criterion, comp_columns, image_columns
+from blastimation.lut import lut_addresses, find_lut, get_lut_row
 from blastimation.meta import Meta
+from blastimation.models import COLUMN_LABELS, CatalogueModel, get_pixmap, gui_cache, render_icon
+from blastimation.playback import FrameRing
 from blastimation.rom import rom
+from blastimation.scheduler import DecodeScheduler, PRIORITY_REST, PRIORITY_SELECTED, PRIORITY_VISIBLE
 from blastimation.blast import Blast, blast_get_lut_size
 
 
+def get_comp_addresses(comp) -> list[int]:
+    match comp.type:
+        case CompType.AnimationComp:
+            return [a for c in comp.comps for a in c.addresses]
+        case _:
+            return comp.addresses
+
+
 class App(QWidget):
+    # Emitted by the loader thread once the ROM and meta are loaded
+    loaded = Signal()
+    # Emitted by the decode workers with a model, address, icon key and icon pixels
+    icon_rendered = Signal(object, int, object, object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Blastimation")
@@ -30,19 +50,33 @@ class App(QWidget):
         ]
 
         self.initialized = False
+        self.loaded.connect(self.on_loaded)
+        self.icon_rendered.connect(self.on_icon_rendered)
 
         self.lut_models = {}
         self.meta = None
 
         self.image = None
         self.comp = None
+        # Cache and key of what is shown
+        self.pinned_keys: list[tuple[MemoryCache, tuple]] = []
         self.animation_timer: QTimer = QTimer()
         self.animation_timer.setInterval(100)
         self.animation_timer.timeout.connect(self.animate)
         self.animation_frame: int = 0
+        self.frame_ring: FrameRing = None
 
+        # Column name -> criterion of both lists
+        self.filter_criteria: dict[str, Criterion] = {}
         self.single_model = self.make_single_model()
         self.composite_model = self.make_composite_model()
+        # Icons are decoded on workers, what is selected or shown first
+        self.scheduler = DecodeScheduler(self.render_icon, lambda job, icon: self.icon_rendered.emit(*job, *icon))
+        for model in [self.single_model, self.composite_model]:
+            model.request_icon = lambda address, model=model: self.request_icon(model, address)
+            # Filtering and sorting move what is shown
+            model.modelReset.connect(self.cancel_visible)
+            model.layoutChanged.connect(self.cancel_visible)
 
         self.list_toggle_button_states = [
             (self.style().standardIcon(QStyle.SP_FileDialogListView), "Grid view"),
@@ -56,118 +90,119 @@ class App(QWidget):
 
         self.single_view = QTreeView()
         self.single_view.sortByColumn(0, Qt.AscendingOrder)
-        self.single_proxy_model = QSortFilterProxyModel()
         self.single_icon_view = QListView()
         self.single_stack_widget = QStackedWidget()
 
         self.composite_view = QTreeView()
         self.composite_view.sortByColumn(0, Qt.AscendingOrder)
-        self.composite_proxy_model = QSortFilterProxyModel()
         self.composite_icon_view = QListView()
         self.composite_stack_widget = QStackedWidget()
 
         self.list_toggle_button = QToolButton()
         self.init_widgets()
 
+    # Frames are decoded and scaled ahead by the frame ring, a tick only
+    # swaps in the next one
     def animate(self):
-        match self.comp.type:
-            case CompType.Animation:
-                frame_addr = self.comp.addresses[self.animation_frame]
-                self.image = rom.images[frame_addr]
-                self.image.decode()
-            case CompType.AnimationComp:
-                self.image = self.comp.comps[self.animation_frame].get_image()
-
-        self.update_image_label()
-
-        self.animation_frame += 1
-        if self.animation_frame >= self.comp.frames():
-            self.animation_frame = 0
+        frame = self.frame_ring.next_frame()
+        if not frame:
+            return
+        self.animation_frame, self.image, scaled = frame
+        height, width = scaled.shape[:2]
+        qimage = QImage(scaled, width, height, 4 * width, QImage.Format_RGBA8888)
+        self.image_label.setPixmap(QPixmap.fromImage(qimage))
+
+    def start_animation(self, start: int = 0):
+        self.stop_animation()
+        size = self.image_label.size()
+        self.frame_ring = FrameRing(self.comp.get_frame, self.comp.frames(), size.width(), size.height(), start)
+        self.animation_timer.start()
+
+    def stop_animation(self):
+        self.animation_timer.stop()
+        if not self.frame_ring:
+            return
+        self.frame_ring.stop()
+        if self.frame_ring.dropped:
+            print("Animation dropped %d of %d frames" % (self.frame_ring.dropped,
+                                                         self.frame_ring.dropped + self.frame_ring.shown))
+        self.frame_ring = None
 
     @staticmethod
     def make_single_model():
-        m = QStandardItemModel(0, 8)
-        m.setHeaderData(0, Qt.Horizontal, "Start")
-        m.setHeaderData(1, Qt.Horizontal, "Name")
-        m.setHeaderData(2, Qt.Horizontal, "Encoding")
-        m.setHeaderData(3, Qt.Horizontal, "Format")
-        m.setHeaderData(4, Qt.Horizontal, "Width")
-        m.setHeaderData(5, Qt.Horizontal, "Height")
-        m.setHeaderData(6, Qt.Horizontal, "Size Enc")
-        m.setHeaderData(7, Qt.Horizontal, "Size Dec")
-        return m
+        return CatalogueModel({"address": "Start", "name": "Name", "blast": "Encoding", "format": "Format",
+                               "width": "Width", "height": "Height", "encoded_size": "Size Enc",
+                               "decoded_size": "Size Dec"})
 
     def populate_single_model(self):
-        for addr, image in rom.images.items():
-
-            if addr in self.meta.in_comp:
-                continue
-
-            image.decode()
-
-            last_row = self.single_model.rowCount()
-            self.single_model.insertRow(last_row)
-            items = image.model_data()
-            for i in range(len(items)):
-                self.single_model.setData(self.single_model.index(last_row, i), items[i])
-
-            # Update icon
-            icon = QIcon(image.pixmap.scaled(
-                QSize(128, 128),
-                Qt.KeepAspectRatio,
-                Qt.FastTransformation,
-            ))
-            self.single_model.item(last_row).setIcon(icon)
+        c = rom.catalogue
+        rows = np.flatnonzero(~np.isin(c.address, list(self.meta.members)))
+        self.single_model.set_rows(
+            image_columns(c, rows) | {"name": np.full(len(rows), "?")},
+            COLUMN_LABELS,
+            lambda address: rom.images[address],
+            lambda address: rom.images[address].memory_key("icon"),
+        )
 
     @staticmethod
     def make_composite_model():
-        m = QStandardItemModel(0, 10)
-        m.setHeaderData(0, Qt.Horizontal, "Start")
-        m.setHeaderData(1, Qt.Horizontal, "Name")
-        m.setHeaderData(2, Qt.Horizontal, "Encoding")
-        m.setHeaderData(3, Qt.Horizontal, "Format")
-        m.setHeaderData(4, Qt.Horizontal, "Width")
-        m.setHeaderData(5, Qt.Horizontal, "Height")
-        m.setHeaderData(6, Qt.Horizontal, "Size Enc")
-        m.setHeaderData(7, Qt.Horizontal, "Size Dec")
-        m.setHeaderData(8, Qt.Horizontal, "Comp")
-        m.setHeaderData(9, Qt.Horizontal, "Frames")
-        return m
+        return CatalogueModel({"address": "Start", "name": "Name", "blast": "Encoding", "format": "Format",
+                               "width": "Width", "height": "Height", "encoded_size": "Size Enc",
+                               "decoded_size": "Size Dec", "comp": "Comp", "frames": "Frames"})
 
     def populate_comp_model(self):
-        for addr, comp in self.meta.comps.items():
-            last_row = self.composite_model.rowCount()
-            self.composite_model.insertRow(last_row)
-
-            items = comp.model_data()
-            for i in range(len(items)):
-                self.composite_model.setData(self.composite_model.index(last_row, i), items[i])
-
-            image = comp.get_image()
-            image.decode()
-            # Update icon
-            icon = QIcon(image.pixmap.scaled(
-                QSize(128, 128),
-                Qt.KeepAspectRatio,
-                Qt.FastTransformation,
-            ))
-            self.composite_model.item(last_row).setIcon(icon)
+        self.composite_model.set_rows(
+            comp_columns(list(self.meta.comps.values())),
+            COLUMN_LABELS,
+            lambda address: self.meta.comps[address].get_image(),
+            lambda address: ("icon", "comp", address, self.meta.comps[address].lut),
+        )
+
+    # Thumbnails are keyed by kind, address and LUT, and checked against
+    # the encoded bytes, sizes and LUTs of the images they are made from
+    def thumbnail_key(self, model: CatalogueModel, address: int) -> tuple[ThumbnailKey, int]:
+        if model is self.single_model:
+            image = rom.images[address]
+            return (0, address, image.lut), zlib.crc32(str(image.cache_key()).encode())
+        comp = self.meta.comps[address]
+        cache_keys = [rom.images[a].cache_key() for a in get_comp_addresses(comp)]
+        return (1, address, comp.lut), zlib.crc32(str((comp.type.value, cache_keys)).encode())
+
+    # Stored thumbnails are shown right away, the others are rendered
+    def request_icon(self, model: CatalogueModel, address: int) -> np.ndarray:
+        rgba = thumbnail_cache.get(*self.thumbnail_key(model, address))
+        if rgba is None:
+            self.scheduler.schedule([(model, address)], PRIORITY_VISIBLE)
+        return rgba
+
+    # Runs on a decode worker, the keys are taken first so a LUT changed
+    # meanwhile only makes an icon nobody asks for. It is only stored if
+    # the thumbnail key is still the same after rendering.
+    def render_icon(self, job: tuple) -> tuple:
+        model, address = job
+        key = model.icon_key(address)
+        thumbnail_key = self.thumbnail_key(model, address)
+        rgba = thumbnail_cache.get(*thumbnail_key)
+        if rgba is None:
+            rgba = render_icon(model.get_image(address))
+            if self.thumbnail_key(model, address) == thumbnail_key:
+                thumbnail_cache.put(*thumbnail_key, rgba)
+        return key, rgba
+
+    def on_icon_rendered(self, model, address, key, rgba):
+        model.set_icon(address, key, rgba)
+
+    # Pending icons of rows no longer shown, the views ask again for theirs
+    def cancel_visible(self):
+        self.scheduler.cancel(PRIORITY_VISIBLE)
 
     def init_luts(self):
         for lut_size in [128, 256]:
             self.lut_models[lut_size] = QStandardItemModel(0, 1)
-            for k in luts[lut_size].keys():
+            for k in lut_addresses[lut_size]:
                 self.lut_models[lut_size].appendRow(QStandardItem("%06X" % k))
 
     def init_widgets(self):
-        self.single_proxy_model.setDynamicSortFilter(True)
-        self.single_proxy_model.setSourceModel(self.single_model)
-        self.single_proxy_model.setFilterKeyColumn(2)
-
-        self.composite_proxy_model.setDynamicSortFilter(True)
-        self.composite_proxy_model.setSourceModel(self.composite_model)
-        self.composite_proxy_model.setFilterKeyColumn(2)
-
         self.image_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.image_label.setAlignment(Qt.AlignCenter)
         screen_geometry: QRect = self.screen().geometry()
@@ -199,26 +234,36 @@ class App(QWidget):
 
         self.single_view.setRootIsDecorated(False)
         self.single_view.setAlternatingRowColors(True)
-        self.single_view.setModel(self.single_proxy_model)
+        # Spares asking every row for its height when an icon arrives
+        self.single_view.setUniformRowHeights(True)
+        self.single_view.setModel(self.single_model)
         self.single_view.selectionModel().currentChanged.connect(self.on_single_select)
         self.single_view.setSortingEnabled(True)
+        self.single_view.verticalScrollBar().valueChanged.connect(self.cancel_visible)
 
         self.single_icon_view.setViewMode(QListView.IconMode)
         self.single_icon_view.setMovement(QListView.Static)
         self.single_icon_view.setIconSize(QSize(128, 128))
-        self.single_icon_view.setModel(self.single_proxy_model)
+        # Otherwise every item is asked for its icon to lay them out
+        self.single_icon_view.setUniformItemSizes(True)
+        self.single_icon_view.verticalScrollBar().valueChanged.connect(self.cancel_visible)
+        self.single_icon_view.setModel(self.single_model)
         self.single_icon_view.selectionModel().currentChanged.connect(self.on_single_select)
 
         self.composite_view.setRootIsDecorated(False)
         self.composite_view.setAlternatingRowColors(True)
-        self.composite_view.setModel(self.composite_proxy_model)
+        self.composite_view.setUniformRowHeights(True)
+        self.composite_view.setModel(self.composite_model)
         self.composite_view.selectionModel().currentChanged.connect(self.on_composite_select)
         self.composite_view.setSortingEnabled(True)
+        self.composite_view.verticalScrollBar().valueChanged.connect(self.cancel_visible)
 
         self.composite_icon_view.setViewMode(QListView.IconMode)
         self.composite_icon_view.setMovement(QListView.Static)
         self.composite_icon_view.setIconSize(QSize(128, 128))
-        self.composite_icon_view.setModel(self.composite_proxy_model)
+        self.composite_icon_view.setUniformItemSizes(True)
+        self.composite_icon_view.verticalScrollBar().valueChanged.connect(self.cancel_visible)
+        self.composite_icon_view.setModel(self.composite_model)
         self.composite_icon_view.selectionModel().currentChanged.connect(self.on_composite_select)
 
         tab_widget = QTabWidget()
@@ -232,6 +277,7 @@ class App(QWidget):
 
         tab_widget.addTab(self.single_stack_widget, "Single")
         tab_widget.addTab(self.composite_stack_widget, "Comp")
+        tab_widget.currentChanged.connect(self.cancel_visible)
 
         self.lut_auto_button.clicked.connect(self.on_auto_lut)
         self.lut_auto_button.hide()
@@ -255,19 +301,20 @@ class App(QWidget):
         self.composite_stack_widget.setCurrentIndex(new_index)
         self.list_toggle_button.setIcon(self.list_toggle_button_states[new_index][0])
         self.list_toggle_button.setToolTip(self.list_toggle_button_states[new_index][1])
+        self.cancel_visible()
 
     def on_single_select(self, model_index):
+        self.stop_animation()
         self.comp = None
-        self.animation_timer.stop()
 
-        addr_i = self.single_proxy_model.index(model_index.row(), 0)
-        addr_str = self.single_proxy_model.data(addr_i)
-        if not addr_str:
+        if not model_index.isValid():
             return
-        addr = int(addr_str, 16)
+        addr = self.single_model.address(model_index.row())
+        self.scheduler.schedule([(self.single_model, addr)], PRIORITY_SELECTED)
 
         self.image = rom.images[addr]
         self.image.decode()
+        self.pin_selection()
 
         self.update_image_label()
 
@@ -276,7 +323,7 @@ class App(QWidget):
             case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
                 lut_size = blast_get_lut_size(self.image.blast)
                 self.lut_combo_box.setModel(self.lut_models[lut_size])
-                lut_index = list(luts[lut_size].keys()).index(self.image.lut)
+                lut_index = get_lut_row(lut_size, self.image.lut)
                 self.lut_combo_box.setCurrentIndex(lut_index)
                 try:
                     self.lut_combo_box.currentIndexChanged.disconnect()
@@ -294,30 +341,43 @@ class App(QWidget):
 
         match self.comp.type:
             case (CompType.Animation | CompType.AnimationComp):
-                self.animation_timer.start()
+                self.start_animation()
             case _:
                 self.image = self.comp.get_image()
                 self.update_image_label()
+        self.pin_selection()
+
+    def pin_selection(self):
+        for cache, key in self.pinned_keys:
+            cache.unpin(key)
+
+        images = [self.image] if self.image else []
+        if self.comp:
+            images.extend(rom.images[a] for a in get_comp_addresses(self.comp))
+
+        self.pinned_keys = [(cache, image.memory_key(kind)) for image in images
+                            for cache, kind in [(memory_cache, "rgba"), (gui_cache, "pixmap")]]
+        for cache, key in self.pinned_keys:
+            cache.pin(key)
 
     def on_composite_select(self, model_index):
-        self.animation_timer.stop()
+        self.stop_animation()
         self.animation_frame = 0
 
-        addr_i = self.composite_proxy_model.index(model_index.row(), 0)
-        addr_str = self.composite_proxy_model.data(addr_i)
-        if not addr_str:
+        if not model_index.isValid():
             return
-        address = int(addr_str, 16)
+        address = self.composite_model.address(model_index.row())
+        self.scheduler.schedule([(self.composite_model, address)], PRIORITY_SELECTED)
 
         self.set_comp(self.meta.comps[address])
 
         # Update LUT combo box
-        match self.comp.blast():
+        match self.comp.blast:
             case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
-                comp_lut = self.comp.lut()
-                lut_size = blast_get_lut_size(self.comp.blast())
+                comp_lut = self.comp.lut
+                lut_size = blast_get_lut_size(self.comp.blast)
                 self.lut_combo_box.setModel(self.lut_models[lut_size])
-                lut_index = list(luts[lut_size].keys()).index(comp_lut)
+                lut_index = get_lut_row(lut_size, comp_lut)
                 self.lut_combo_box.setCurrentIndex(lut_index)
                 try:
                     self.lut_combo_box.currentIndexChanged.disconnect()
@@ -332,78 +392,94 @@ class App(QWidget):
 
     def on_lut_select(self, index):
         if self.comp:
-            match self.comp.blast():
+            # The frame ring reads the images being changed
+            self.stop_animation()
+            match self.comp.blast:
                 case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
-                    lut_size = blast_get_lut_size(self.comp.blast())
-                    new_lut = int(self.lut_models[lut_size].item(index).text(), 16)
+                    lut_size = blast_get_lut_size(self.comp.blast)
+                    new_lut = lut_addresses[lut_size][index]
                     self.comp.set_lut(new_lut)
                     self.set_comp(self.comp)
+                    self.composite_model.refresh(self.comp.start())
         else:
             match self.image.blast:
                 case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
                     lut_size = blast_get_lut_size(self.image.blast)
-                    self.image.lut = int(self.lut_models[lut_size].item(index).text(), 16)
-                    self.image.decode()
+                    self.image.lut = lut_addresses[lut_size][index]
+                    self.image.decode(force=True)
+                    self.pin_selection()
                     self.update_image_label()
+                    self.single_model.refresh(self.image.address)
+
+    # Criteria on columns a model lacks only filter the other one
+    def set_filter(self, name: str, criterion: Criterion):
+        self.filter_criteria[name] = criterion
+        self.single_model.set_filter(self.filter_criteria)
+        self.composite_model.set_filter(self.filter_criteria)
 
     def on_blast_filter_changed(self, index):
         blast_type = self.blast_filter_types[index]
-        if not blast_type:
-            self.single_proxy_model.setFilterFixedString("")
-            self.composite_proxy_model.setFilterFixedString("")
-            return
-
-        self.single_proxy_model.setFilterFixedString(blast_type.name)
-        self.composite_proxy_model.setFilterFixedString(blast_type.name)
+        self.set_filter("blast", blast_type.value if blast_type else None)
 
     def on_auto_lut(self):
         match self.image.blast:
             case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
                 lut_size = blast_get_lut_size(self.image.blast)
 
-                last_k = 0
-                lut_keys = list(luts[lut_size].keys())
-                lut_keys.sort()
-
-                row = -1
-                for k in lut_keys:
-                    if k > self.image.address:
-                        break
-                    last_k = k
-                    row += 1
+                last_k = find_lut(self.image.blast, self.image.address)
                 assert last_k != 0
+                row = get_lut_row(lut_size, last_k)
 
                 self.image.lut = last_k
                 print(f"Found auto lut %06X" % last_k)
                 self.lut_combo_box.setCurrentIndex(row)
 
     def resizeEvent(self, event):
+        if self.frame_ring:
+            self.start_animation(self.animation_frame + 1)
+            return
         if not self.image:
             return
-        scaled_size = self.image.pixmap.size()
+        scaled_size = get_pixmap(self.image).size()
         scaled_size.scale(self.image_label.size(), Qt.KeepAspectRatio)
         if scaled_size != self.image_label.pixmap().size():
             self.update_image_label()
 
+    # Runs on a loader thread, the models are filled on the GUI thread
     def post_initialize(self):
         rom.load(sys.argv[1])
         self.meta = Meta()
+        self.loaded.emit()
+
+    def on_loaded(self):
         self.init_luts()
         self.image = list(rom.images.values())[0]
         self.image.decode()
+        self.pin_selection()
         self.update_image_label()
         self.populate_single_model()
         self.populate_comp_model()
-        self.initialized = True
+        # Behind whatever the views ask for, stored thumbnails are read when shown
+        jobs = [(model, a) for model in [self.single_model, self.composite_model] for a in model.addresses()]
+        self.scheduler.schedule([job for job in jobs if not thumbnail_cache.has(*self.thumbnail_key(*job))],
+                                PRIORITY_REST)
+
+    def closeEvent(self, event):
+        self.stop_animation()
+        self.scheduler.stop()
+        decode_cache.save()
+        thumbnail_cache.save()
+        super().closeEvent(event)
 
     def changeEvent(self, event):
         if event.type() == QEvent.ActivationChange and not self.initialized:
+            self.initialized = True
             t = threading.Thread(target=self.post_initialize)
             t.start()
 
     def update_image_label(self):
         self.image_label.setPixmap(
-            self.image.pixmap.scaled(
+            get_pixmap(self.image).scaled(
                 self.image_label.size(),
                 Qt.KeepAspectRatio,
                 Qt.FastTransformation,
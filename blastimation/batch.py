@@ -0,0 +1,80 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable
+
+from blastimation.blast import Blast, blast_check_literals, blast_get_lut_size, blast_has_lut, \
+    blast_lookup_invalid_literals, blast_lookup_table, blast_parse_rgba, blast_literal_table, execute_plan, make_plan
+from blastimation.pipeline import blast_literal_rgba_table, blast_rgba_table, render_plan
+
+BATCH_SIZE = 32
+
+# (address, blast, encoded size, lut, width, height). Images and LUTs
+# start at their address in the ROM.
+DecodeJob = tuple[int, Blast, int, int, int, int]
+
+# Per process ROM mappings, and the tables and invalid literals of the LUTs
+_roms: dict[str, memoryview] = {}
+_lut_tables = {}
+
+
+def _get_rom(rom_path: str) -> memoryview:
+    if rom_path not in _roms:
+        with open(rom_path, "rb") as f:
+            _roms[rom_path] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return _roms[rom_path]
+
+
+# Decoded bytes, or RGBA8888 rows flipped for display when parse is set
+def decode_job(rom_data: memoryview, job: DecodeJob, parse: bool = False) -> bytes:
+    address, blast_type, size, lut, width, height = job
+    encoded = rom_data[address:address + size]
+
+    if blast_type == Blast.BLAST0:
+        if parse:
+            return blast_parse_rgba(blast_type, encoded, width, height, False, True)
+        return bytes(encoded)
+
+    plan = make_plan(blast_type, encoded)
+
+    if blast_has_lut(blast_type):
+        key = (id(rom_data), blast_type, lut)
+        if key not in _lut_tables:
+            lut_bytes = rom_data[lut:lut + blast_get_lut_size(blast_type)]
+            table = blast_lookup_table(blast_type, lut_bytes)
+            _lut_tables[key] = (table, blast_rgba_table(blast_type, table),
+                                blast_lookup_invalid_literals(blast_type, lut_bytes))
+        table, rgba_table, invalid_literals = _lut_tables[key]
+        blast_check_literals(plan, invalid_literals)
+    else:
+        table = blast_literal_table(blast_type)
+        rgba_table = blast_literal_rgba_table(blast_type)
+
+    if parse:
+        return render_plan(blast_type, plan, table, rgba_table, width, height)
+    return execute_plan(plan, table)
+
+
+def _decode_jobs(rom_path: str, jobs: list[DecodeJob], parse: bool) -> list[tuple[int, bytes]]:
+    rom_data = _get_rom(rom_path)
+    return [(job[0], decode_job(rom_data, job, parse)) for job in jobs]
+
+
+def decode_jobs(rom_path: str, jobs: list[DecodeJob], parse: bool = False, processes: int = None,
+                progress: Callable[[int, int], None] = None) -> dict[int, bytes]:
+    results = {}
+    if not jobs:
+        return results
+
+    # Biggest first, so the pool does not wait on one large texture at the end
+    jobs = sorted(jobs, key=lambda j: j[2], reverse=True)
+    batches = [jobs[i:i + BATCH_SIZE] for i in range(0, len(jobs), BATCH_SIZE)]
+
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        futures = [executor.submit(_decode_jobs, rom_path, batch, parse) for batch in batches]
+        for future in as_completed(futures):
+            results.update(future.result())
+            if progress:
+                progress(len(results), len(jobs))
+
+    return results
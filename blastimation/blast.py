@@ -1,7 +1,9 @@
 import struct
 from enum import Enum
 
-from blastimation.tex64 import parse_rgba16, parse_ia8, parse_rgba32
+import numpy as np
+
+from blastimation.tex64 import parse_rgba16_table, parse_ia8_rgba, parse_ia16_rgba, parse_rgba32_rgba
 
 
 class Blast(Enum):
@@ -14,18 +16,27 @@ class Blast(Enum):
     BLAST6_IA8 = 6
 
 
-def blast_parse_image(blast_type: Blast, data: bytes,
-                      width: int, height: int,
-                      flip_h: bool = False, flip_v: bool = False):
+# Decoded bytes as RGBA8888 rows
+def blast_parse_rgba(blast_type: Blast, data: bytes,
+                     width: int, height: int,
+                     flip_h: bool = False, flip_v: bool = False) -> np.ndarray:
     match blast_type:
         case Blast.BLAST1_RGBA16:
-            return parse_rgba16(data, width, height, flip_h, flip_v)
+            return parse_rgba16_table(data, width, height, flip_h, flip_v)
         case (Blast.BLAST3_IA8 | Blast.BLAST6_IA8):
-            return parse_ia8(data, width, height, flip_h, flip_v)
-        case (Blast.BLAST2_RGBA32 | Blast.BLAST5_RGBA32):
-            return parse_rgba32(data, width, height, flip_h, flip_v)
+            return parse_ia8_rgba(data, width, height, flip_h, flip_v)
+        case Blast.BLAST4_IA16:
+            return parse_ia16_rgba(data, width, height, flip_h, flip_v)
+        case _:
+            return parse_rgba32_rgba(data, width, height, flip_h, flip_v)
+
+
+def blast_get_pixels_per_element(blast_type: Blast) -> int:
+    match blast_type:
+        case (Blast.BLAST3_IA8 | Blast.BLAST4_IA16 | Blast.BLAST6_IA8):
+            return 2
         case _:
-            return data
+            return 1
 
 
 def blast_get_lut_size(blast_type: Blast):
@@ -147,6 +158,258 @@ def decode_blast_generic(encoded: bytes, decode_single_fun, element_size: int,
     return decoded_bytes
 
 
+# Literal words only carry 15 bits, so every literal transform can be
+# precomputed into a table of 0x8000 big endian elements.
+def _build_literal_table(blast_type: Blast) -> np.ndarray:
+    current = np.arange(0x8000, dtype=np.uint32)
+    match blast_type:
+        case Blast.BLAST1_RGBA16:
+            table = ((current & 0xFFC0) << 1) | (current & 0x3F)
+            return table.astype(">u2")
+        case Blast.BLAST2_RGBA32:
+            table = ((current & 0x7800) << 0x11) | ((current & 0x0780) << 0xD) \
+                | ((current & 0x78) << 0x9) | ((current & 0x7) << 0x5)
+            return table.astype(">u4")
+        case Blast.BLAST3_IA8:
+            table = ((current >> 8) << 9) | ((current & 0xFF) << 1)
+            return table.astype(">u2")
+        case Blast.BLAST6_IA8:
+            part0 = current >> 8
+            part1 = current & 0xFF
+            part0 = ((part0 & 0x38) << 2) | ((part0 & 0x07) << 1)
+            part1 = ((part1 & 0x38) << 2) | ((part1 & 0x07) << 1)
+            return ((part0 << 8) | part1).astype(">u2")
+
+
+# Literal bits that would overflow the transform (or the LUT) and make
+# the reference decoders fail.
+def blast_get_literal_invalid_bits(blast_type: Blast) -> int:
+    match blast_type:
+        case (Blast.BLAST3_IA8 | Blast.BLAST4_IA16):
+            return 0x0080
+        case Blast.BLAST5_RGBA32:
+            return 0x7800
+        case _:
+            return 0
+
+
+# Literals looking up a LUT word the transform would overflow, which the
+# reference decoders fail on like on the invalid literal bits. Only
+# BLAST4 shifts its LUT words.
+def blast_lookup_invalid_literals(blast_type: Blast, lut: bytes) -> np.ndarray:
+    current = np.arange(0x8000, dtype=np.uint32)
+    match blast_type:
+        case Blast.BLAST4_IA16:
+            lut_words = np.frombuffer(lut, dtype=">u2")
+            overflows = lut_words >= 0x8000
+            index_mask = len(lut_words) - 1
+            return overflows[(current >> 9) & index_mask] | overflows[(current >> 1) & 0x7F & index_mask]
+        case _:
+            return np.zeros(0x8000, dtype=bool)
+
+
+def blast_check_lookup(blast_type: Blast, plan: "BlastPlan", lut: bytes):
+    blast_check_literals(plan, blast_lookup_invalid_literals(blast_type, lut))
+
+
+# With the invalid literals of a LUT computed once
+def blast_check_literals(plan: "BlastPlan", invalid_literals: np.ndarray):
+    if np.any(invalid_literals[plan.literals]):
+        raise ValueError("Literal word looks up a LUT word out of range.")
+
+
+def blast_lookup_table(blast_type: Blast, lut: bytes) -> np.ndarray:
+    current = np.arange(0x8000, dtype=np.uint32)
+    lut_words = np.frombuffer(lut, dtype=">u2").astype(np.uint32)
+    # Literals which would read past the LUT are rejected by make_plan
+    index_mask = len(lut_words) - 1
+    match blast_type:
+        case Blast.BLAST4_IA16:
+            # Entries of LUT words that overflow are rejected by
+            # blast_check_lookup, they only keep the table 16 bit
+            part0 = current >> 8
+            part1 = current & 0xFF
+            part0 = ((lut_words[(part0 >> 1) & index_mask] << 1) | (part0 & 1)) & 0xFFFF
+            part1 = ((lut_words[(part1 >> 1) & index_mask] << 1) | (part1 & 1)) & 0xFFFF
+            return ((part0 << 16) | part1).astype(">u4")
+        case Blast.BLAST5_RGBA32:
+            t1 = lut_words[(current >> 4) & index_mask]
+            table = ((t1 & 0x7C00) << 0x11) | ((t1 & 0x03E0) << 0xE) \
+                | ((t1 & 0x1F) << 0xB) | ((current & 0xF) << 4)
+            return table.astype(">u4")
+
+
+_literal_tables: dict[Blast, np.ndarray] = {}
+
+
+def blast_literal_table(blast_type: Blast) -> np.ndarray:
+    if blast_type not in _literal_tables:
+        _literal_tables[blast_type] = _build_literal_table(blast_type)
+    return _literal_tables[blast_type]
+
+
+def blast_get_loop_back(blast_type: Blast) -> tuple[int, int, int]:
+    match blast_type:
+        case (Blast.BLAST1_RGBA16 | Blast.BLAST3_IA8 | Blast.BLAST6_IA8):
+            return 2, 0x7FFF, 5
+        case (Blast.BLAST2_RGBA32 | Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
+            return 4, 0x7FE0, 4
+
+
+# A parsed command stream. Literal words are kept in stream order and
+# written in runs, loop backs become plain copies inside the output.
+class BlastPlan:
+    def __init__(self, element_size: int, size: int, literals: np.ndarray,
+                 run_dst: np.ndarray, run_count: np.ndarray, copies: np.ndarray):
+        self.element_size: int = element_size
+        self.size: int = size
+        self.literals: np.ndarray = literals
+        self.run_dst: np.ndarray = run_dst
+        self.run_count: np.ndarray = run_count
+        # (dst, src, length) in bytes
+        self.copies: np.ndarray = copies
+        # Whether every copy moves whole elements, so the plan can run on
+        # the literal words (LUT indices) instead of the final bytes.
+        self.aligned: bool = not np.any(copies % element_size)
+
+    @property
+    def nbytes(self) -> int:
+        return self.literals.nbytes + self.run_dst.nbytes + self.run_count.nbytes + self.copies.nbytes
+
+
+def make_plan(blast_type: Blast, encoded: bytes) -> BlastPlan:
+    element_size, loop_back_and, loop_back_shift = blast_get_loop_back(blast_type)
+
+    words = np.frombuffer(encoded, dtype=">u2")
+    is_literal = (words & 0x8000) == 0
+
+    invalid_bits = blast_get_literal_invalid_bits(blast_type)
+    if invalid_bits and np.any(is_literal & ((words & invalid_bits) != 0)):
+        raise ValueError("Literal word out of range.")
+
+    commands = np.flatnonzero(~is_literal)
+
+    run_dst = []
+    run_count = []
+    copies = []
+    size = 0
+    literal_start = 0
+    for i, current in zip(commands.tolist(), words[commands].tolist()):
+        if i > literal_start:
+            run_dst.append(size)
+            run_count.append(i - literal_start)
+            size += (i - literal_start) * element_size
+        literal_start = i + 1
+
+        loop_back_length = current & 0x1F
+        loop_back_offset = (current & loop_back_and) >> loop_back_shift
+
+        slice_from = size - loop_back_offset
+        slice_to = slice_from + loop_back_length * element_size
+
+        # Same clamping as slicing the partially decoded bytes, so the
+        # source never reaches into the destination.
+        start, stop, _ = slice(slice_from, slice_to).indices(size)
+        if stop > start:
+            copies.append((size, start, stop - start))
+            size += stop - start
+
+    if len(words) > literal_start:
+        run_dst.append(size)
+        run_count.append(len(words) - literal_start)
+        size += (len(words) - literal_start) * element_size
+
+    return BlastPlan(element_size, size,
+                     words[is_literal].astype(np.uint16),
+                     np.array(run_dst, dtype=np.int64),
+                     np.array(run_count, dtype=np.int64),
+                     np.array(copies, dtype=np.int64).reshape(-1, 3))
+
+
+def execute_plan(plan: BlastPlan, table: np.ndarray) -> bytearray:
+    assert table.itemsize == plan.element_size
+
+    if plan.aligned:
+        return apply_table(execute_plan_indices(plan), table)
+
+    decoded_bytes = bytearray(plan.size)
+
+    if len(plan.literals):
+        literal_bytes = table[plan.literals].view(np.uint8)
+        run_bytes = plan.run_count * plan.element_size
+        # Destination of every literal byte, run by run
+        literal_dst = np.repeat(plan.run_dst - (np.cumsum(run_bytes) - run_bytes), run_bytes)
+        literal_dst += np.arange(len(literal_bytes))
+        np.frombuffer(decoded_bytes, dtype=np.uint8)[literal_dst] = literal_bytes
+
+    view = memoryview(decoded_bytes)
+    for dst, src, length in plan.copies.tolist():
+        view[dst:dst + length] = view[src:src + length]
+
+    return decoded_bytes
+
+
+# Runs an aligned plan on the literal words, one element per word.
+def execute_plan_indices(plan: BlastPlan) -> np.ndarray:
+    assert plan.aligned
+
+    indices = np.empty(plan.size // plan.element_size, dtype=np.uint16)
+
+    if len(plan.literals):
+        run_dst = plan.run_dst // plan.element_size
+        literal_dst = np.repeat(run_dst - (np.cumsum(plan.run_count) - plan.run_count), plan.run_count)
+        literal_dst += np.arange(len(plan.literals))
+        indices[literal_dst] = plan.literals
+
+    view = memoryview(indices)
+    for dst, src, length in (plan.copies // plan.element_size).tolist():
+        view[dst:dst + length] = view[src:src + length]
+
+    return indices
+
+
+def apply_table(indices: np.ndarray, table: np.ndarray) -> bytearray:
+    decoded_bytes = bytearray(len(indices) * table.itemsize)
+    np.take(table, indices, out=np.frombuffer(decoded_bytes, dtype=table.dtype))
+    return decoded_bytes
+
+
+def blast_decoded_size(blast_type: Blast, encoded: bytes) -> int:
+    if blast_type == Blast.BLAST0:
+        return len(encoded)
+
+    element_size, loop_back_and, loop_back_shift = blast_get_loop_back(blast_type)
+
+    words = np.frombuffer(encoded, dtype=">u2")
+    commands = np.flatnonzero(words & 0x8000)
+    if not len(commands):
+        return len(words) * element_size
+    current = words[commands].astype(np.int64)
+
+    literal_bytes = (np.diff(commands, prepend=-1) - 1) * element_size
+    loop_back_bytes = (current & 0x1F) * element_size
+    loop_back_offset = (current & loop_back_and) >> loop_back_shift
+    trailing_bytes = (len(words) - len(commands)) * element_size - int(literal_bytes.sum())
+
+    # Fast path, no loop back is clamped by the slice semantics
+    size_before = np.cumsum(literal_bytes + loop_back_bytes) - loop_back_bytes
+    if np.all((loop_back_offset >= loop_back_bytes) & (loop_back_offset <= size_before)):
+        return int(size_before[-1] + loop_back_bytes[-1]) + trailing_bytes
+
+    size = 0
+    for literal_size, loop_back_size, offset in zip(literal_bytes.tolist(), loop_back_bytes.tolist(),
+                                                    loop_back_offset.tolist()):
+        size += literal_size
+        start, stop, _ = slice(size - offset, size - offset + loop_back_size).indices(size)
+        size += max(stop - start, 0)
+
+    return size + trailing_bytes
+
+
+def decode_blast_table(blast_type: Blast, encoded: bytes) -> bytes:
+    return execute_plan(make_plan(blast_type, encoded), blast_literal_table(blast_type))
+
+
 # Based on 802A5AE0 (061320)
 def decode_blast1(encoded: bytes) -> bytes:
     def single(current: int) -> bytes:
@@ -254,10 +517,12 @@ def decode_blast6(encoded: bytes) -> bytes:
     return decode_blast_generic(encoded, single, 2, 0x7FFF, 5)
 
 
-def decode_blast(blast_type: Blast, encoded: bytes) -> bytes:
+def decode_blast(blast_type: Blast, encoded: bytes, use_tables: bool = True) -> bytes:
     match blast_type:
         case Blast.BLAST0:
             return encoded
+        case (Blast.BLAST1_RGBA16 | Blast.BLAST2_RGBA32 | Blast.BLAST3_IA8 | Blast.BLAST6_IA8) if use_tables:
+            return decode_blast_table(blast_type, encoded)
         case Blast.BLAST1_RGBA16:
             return decode_blast1(encoded)
         case Blast.BLAST2_RGBA32:
@@ -268,8 +533,12 @@ def decode_blast(blast_type: Blast, encoded: bytes) -> bytes:
             return decode_blast6(encoded)
 
 
-def decode_blast_lookup(blast_type: Blast, encoded: bytes, lut: bytes) -> bytes:
+def decode_blast_lookup(blast_type: Blast, encoded: bytes, lut: bytes, use_tables: bool = True) -> bytes:
     match blast_type:
+        case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32) if use_tables:
+            plan = make_plan(blast_type, encoded)
+            blast_check_lookup(blast_type, plan, lut)
+            return execute_plan(plan, blast_lookup_table(blast_type, lut))
         case Blast.BLAST4_IA16:
             return decode_blast4(encoded, lut)
         case Blast.BLAST5_RGBA32:
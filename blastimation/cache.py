@@ -0,0 +1,498 @@
+import itertools
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_MAGIC = b"BLSTDECO"
+CACHE_VERSION = 2
+
+# magic, version, rom hash, index offset, entry count
+HEADER = struct.Struct(">8sI20sQQ")
+# address, blast, width, height, lut, check, offset, size
+INDEX_ENTRY = struct.Struct(">IHHHIIQQ")
+
+# Decoded bytes kept in memory before they are written out
+PENDING_SIZE = 64 * 1024 * 1024
+
+# address, blast, width, height, lut
+CacheKey = tuple[int, int, int, int, int]
+
+THUMBNAIL_MAGIC = b"BLSTTHMB"
+THUMBNAIL_VERSION = 2
+THUMBNAIL_SIZE = 128
+# Thumbnails per atlas page, the file grows a page at a time
+PAGE_SLOTS = 64
+SLOT_SIZE = THUMBNAIL_SIZE * THUMBNAIL_SIZE * 4
+PAGE_SIZE = PAGE_SLOTS * SLOT_SIZE
+# Pages start page aligned after the header, and stay aligned
+PAGES_OFFSET = 4096
+# Thumbnails kept in memory before they are written out
+PENDING_THUMBNAILS = 4 * PAGE_SLOTS
+
+# magic, version, rom hash, index offset, page count, entry count
+THUMBNAIL_HEADER = struct.Struct(">8sI20sQII")
+# The index starts with the offset of every page, then the entries
+PAGE_OFFSET = struct.Struct(">Q")
+# kind, address, lut, check, slot, width, height
+THUMBNAIL_ENTRY = struct.Struct(">BIIIIHH")
+
+# kind, address, lut
+ThumbnailKey = tuple[int, int, int]
+
+
+def get_cache_dir() -> str:
+    return os.environ.get("BLASTIMATION_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "blastimation"))
+
+
+# In MiB
+def get_memory_budget() -> int:
+    return int(os.environ.get("BLASTIMATION_MEMORY", "512")) * 1024 * 1024
+
+
+# RGBA8888 pixel buffers of one ROM in a single memory mapped file:
+# [header][data][data]...[index]. New entries and a new index are
+# appended and the header is written last, so existing data never moves,
+# views handed out stay valid and a crash leaves the old index whole.
+# The file is compacted on open once most of it is dead. Decode workers
+# share it with the GUI.
+class DecodeCache:
+    def __init__(self):
+        self.path: str = ""
+        self.rom_hash: bytes = b""
+        self.entries: dict[CacheKey, tuple[int, int, int]] = {}
+        self.pending: dict[CacheKey, tuple[int, bytes]] = {}
+        self.pending_size: int = 0
+        self.mapping: mmap.mmap = None
+        self.index_offset: int = HEADER.size
+        # Bytes of the file no entry or the index uses
+        self.dead_size: int = 0
+        self.dirty: bool = False
+        self.lock: threading.RLock = threading.RLock()
+
+    def open(self, path: str, rom_hash: bytes):
+        with self.lock:
+            self.path = path
+            self.rom_hash = rom_hash
+            self.load()
+            if self.mapping and self.dead_size > len(self.mapping) // 2:
+                self.compact()
+
+    def load(self):
+        self.entries = {}
+        self.pending = {}
+        self.pending_size = 0
+        self.mapping = None
+        self.index_offset = HEADER.size
+        self.dead_size = 0
+        self.dirty = True
+
+        try:
+            with open(self.path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+
+        if len(mapping) < HEADER.size:
+            return
+        magic, version, file_rom_hash, index_offset, count = HEADER.unpack_from(mapping)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or file_rom_hash != self.rom_hash:
+            print(f"Discarding decode cache {self.path}")
+            return
+        if index_offset + count * INDEX_ENTRY.size > len(mapping):
+            print(f"Discarding truncated decode cache {self.path}")
+            return
+
+        live_size = HEADER.size + count * INDEX_ENTRY.size
+        for i in range(count):
+            address, blast, width, height, lut, check, offset, size = \
+                INDEX_ENTRY.unpack_from(mapping, index_offset + i * INDEX_ENTRY.size)
+            if offset + size <= index_offset:
+                self.entries[(address, blast, width, height, lut)] = (check, offset, size)
+                live_size += size
+
+        self.mapping = mapping
+        self.index_offset = index_offset
+        self.dead_size = len(mapping) - live_size
+        self.dirty = False
+
+    def get(self, key: CacheKey, check: int) -> memoryview:
+        with self.lock:
+            if key in self.pending:
+                pending_check, data = self.pending[key]
+                return memoryview(data) if pending_check == check else None
+            if key not in self.entries or not self.mapping:
+                return None
+            entry_check, offset, size = self.entries[key]
+            if entry_check != check:
+                self.invalidate(key)
+                return None
+            return memoryview(self.mapping)[offset:offset + size]
+
+    # Written out once PENDING_SIZE bytes are pending
+    def put(self, key: CacheKey, check: int, data: bytes):
+        with self.lock:
+            if self.path:
+                self.invalidate(key)
+                self.pending[key] = (check, bytes(data))
+                self.pending_size += len(data)
+                self.dirty = True
+                if self.pending_size >= PENDING_SIZE:
+                    self.save()
+
+    def invalidate(self, key: CacheKey):
+        with self.lock:
+            if key in self.entries or key in self.pending:
+                self.entries.pop(key, None)
+                if key in self.pending:
+                    self.pending_size -= len(self.pending.pop(key)[1])
+                self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            mode = "r+b" if self.mapping else "w+b"
+            with open(self.path, mode) as f:
+                # After the old index, which stays valid until the header
+                # points at the new one
+                offset = f.seek(0, os.SEEK_END) if self.mapping else HEADER.size
+                f.seek(offset)
+                offset = self.write_entries(f, offset, self.pending)
+                f.flush()
+                os.fsync(f.fileno())
+
+                f.seek(0)
+                f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, self.rom_hash, offset, len(self.entries)))
+
+            self.load()
+
+    # Writes data and the index of every entry from offset, returns the
+    # index offset
+    def write_entries(self, f, offset: int, data: dict[CacheKey, tuple[int, bytes]]) -> int:
+        for key, (check, value) in data.items():
+            # Keep entries 8 byte aligned for array views
+            padding = -offset % 8
+            f.write(bytes(padding))
+            offset += padding
+            f.write(value)
+            self.entries[key] = (check, offset, len(value))
+            offset += len(value)
+
+        for key, (check, data_offset, size) in self.entries.items():
+            f.write(INDEX_ENTRY.pack(*key, check, data_offset, size))
+        return offset
+
+    # Copies the live entries into a new file that replaces the old one.
+    # Only done on open, before any views of the mapping are handed out.
+    def compact(self):
+        temp_path = self.path + ".tmp"
+        mapping = memoryview(self.mapping)
+        data = {key: (check, mapping[offset:offset + size]) for key, (check, offset, size) in self.entries.items()}
+        self.entries = {}
+        with open(temp_path, "w+b") as f:
+            f.seek(HEADER.size)
+            index_offset = self.write_entries(f, HEADER.size, data)
+            f.seek(0)
+            f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, self.rom_hash, index_offset, len(self.entries)))
+            f.flush()
+            os.fsync(f.fileno())
+
+        data = None
+        mapping.release()
+        self.mapping.close()
+        self.mapping = None
+        os.replace(temp_path, self.path)
+        self.load()
+
+
+decode_cache = DecodeCache()
+
+
+# Icons of one ROM packed into pages of THUMBNAIL_SIZE square RGBA8888
+# slots in a single memory mapped file: [header][page][page]...[index].
+# A thumbnail is read as a slice of its page, nothing is decoded. Like the
+# decode cache the file is only appended to and the header is written
+# last: new and changed thumbnails go into slots the index on disk does
+# not use, new pages and the new index are appended. They are written out
+# every PENDING_THUMBNAILS, without holding the lock readers take.
+class ThumbnailCache:
+    def __init__(self):
+        self.path: str = ""
+        self.rom_hash: bytes = b""
+        # key -> check, slot, width, height
+        self.entries: dict[ThumbnailKey, tuple[int, int, int, int]] = {}
+        self.pending: dict[ThumbnailKey, tuple[int, np.ndarray]] = {}
+        # Pending thumbnails a save is writing, still served from memory
+        self.writing: dict[ThumbnailKey, tuple[int, np.ndarray]] = {}
+        self.mapping: mmap.mmap = None
+        self.page_offsets: list[int] = []
+        # (PAGE_SLOTS, THUMBNAIL_SIZE, THUMBNAIL_SIZE, 4) views onto the mapping
+        self.pages: list[np.ndarray] = []
+        # Bytes of old indexes
+        self.dead_size: int = 0
+        self.dirty: bool = False
+        self.lock: threading.RLock = threading.RLock()
+        # Held for the file I/O of a save
+        self.save_lock: threading.Lock = threading.Lock()
+
+    def open(self, path: str, rom_hash: bytes):
+        with self.save_lock, self.lock:
+            self.path = path
+            self.rom_hash = rom_hash
+            self.pending = {}
+            self.writing = {}
+            self.load()
+            if self.mapping and self.dead_size > len(self.mapping) // 8:
+                self.compact()
+
+    def load(self):
+        self.entries = {}
+        self.page_offsets = []
+        self.pages = []
+        if self.mapping:
+            self.mapping.close()
+        self.mapping = None
+        self.dead_size = 0
+        self.dirty = True
+
+        try:
+            with open(self.path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+
+        if len(mapping) < PAGES_OFFSET:
+            return
+        magic, version, file_rom_hash, index_offset, page_count, count = THUMBNAIL_HEADER.unpack_from(mapping)
+        if magic != THUMBNAIL_MAGIC or version != THUMBNAIL_VERSION or file_rom_hash != self.rom_hash:
+            print(f"Discarding thumbnail cache {self.path}")
+            return
+        index_size = page_count * PAGE_OFFSET.size + count * THUMBNAIL_ENTRY.size
+        if index_offset + index_size > len(mapping):
+            print(f"Discarding truncated thumbnail cache {self.path}")
+            return
+
+        page_offsets = [PAGE_OFFSET.unpack_from(mapping, index_offset + i * PAGE_OFFSET.size)[0]
+                        for i in range(page_count)]
+        if any(offset + PAGE_SIZE > index_offset for offset in page_offsets):
+            print(f"Discarding truncated thumbnail cache {self.path}")
+            return
+        entries_offset = index_offset + page_count * PAGE_OFFSET.size
+        for i in range(count):
+            kind, address, lut, check, slot, width, height = \
+                THUMBNAIL_ENTRY.unpack_from(mapping, entries_offset + i * THUMBNAIL_ENTRY.size)
+            if slot < page_count * PAGE_SLOTS:
+                self.entries[(kind, address, lut)] = (check, slot, width, height)
+
+        self.mapping = mapping
+        self.page_offsets = page_offsets
+        self.pages = [np.frombuffer(mapping, np.uint8, PAGE_SIZE, offset)
+                      .reshape(PAGE_SLOTS, THUMBNAIL_SIZE, THUMBNAIL_SIZE, 4) for offset in page_offsets]
+        self.dead_size = len(mapping) - PAGES_OFFSET - page_count * PAGE_SIZE - index_size
+        self.dirty = False
+
+    def has(self, key: ThumbnailKey, check: int) -> bool:
+        with self.lock:
+            for pending in [self.pending, self.writing]:
+                if key in pending:
+                    return pending[key][0] == check
+            return key in self.entries and self.entries[key][0] == check
+
+    # A copy, the slot is reused once the thumbnail changes
+    def get(self, key: ThumbnailKey, check: int) -> np.ndarray:
+        with self.lock:
+            for pending in [self.pending, self.writing]:
+                if key in pending:
+                    pending_check, rgba = pending[key]
+                    return rgba if pending_check == check else None
+            if key not in self.entries:
+                return None
+            entry_check, slot, width, height = self.entries[key]
+            if entry_check != check:
+                return None
+            page, index = divmod(slot, PAGE_SLOTS)
+            return self.pages[page][index, :height, :width].copy()
+
+    def put(self, key: ThumbnailKey, check: int, rgba: np.ndarray):
+        assert rgba.shape[0] <= THUMBNAIL_SIZE and rgba.shape[1] <= THUMBNAIL_SIZE
+        with self.lock:
+            if not self.path:
+                return
+            self.pending[key] = (check, rgba)
+            self.dirty = True
+            flush = len(self.pending) >= PENDING_THUMBNAILS
+        if flush:
+            # Another worker may already be saving
+            self.save(block=False)
+
+    def save(self, block: bool = True):
+        if not self.save_lock.acquire(blocking=block):
+            return
+        try:
+            with self.lock:
+                if not self.path or not self.dirty:
+                    return
+                writing = self.writing = self.pending
+                self.pending = {}
+                entries = dict(self.entries)
+                page_offsets = list(self.page_offsets)
+                exists = self.mapping is not None
+
+            try:
+                self.write(writing, entries, page_offsets, exists)
+            except BaseException:
+                with self.lock:
+                    self.pending = writing | self.pending
+                    self.writing = {}
+                raise
+
+            with self.lock:
+                self.writing = {}
+                self.load()
+                self.dirty = bool(self.pending)
+        finally:
+            self.save_lock.release()
+
+    def write(self, writing: dict[ThumbnailKey, tuple[int, np.ndarray]],
+              entries: dict[ThumbnailKey, tuple[int, int, int, int]], page_offsets: list[int], exists: bool):
+        # Slots the index on disk does not use, the ones left by changed
+        # thumbnails are free once the new index is written
+        used = {slot for _, slot, _, _ in entries.values()}
+        free = (slot for slot in itertools.count() if slot not in used)
+        slots = {key: next(free) for key in writing}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "r+b" if exists else "w+b") as f:
+            end = f.seek(0, os.SEEK_END) if exists else PAGES_OFFSET
+            while len(page_offsets) * PAGE_SLOTS <= max(slots.values(), default=-1):
+                end += -end % PAGES_OFFSET
+                page_offsets.append(end)
+                end += PAGE_SIZE
+            f.truncate(end)
+
+            tile = np.zeros((THUMBNAIL_SIZE, THUMBNAIL_SIZE, 4), dtype=np.uint8)
+            for key, (check, rgba) in writing.items():
+                height, width = rgba.shape[:2]
+                tile.fill(0)
+                tile[:height, :width] = rgba
+                page, index = divmod(slots[key], PAGE_SLOTS)
+                f.seek(page_offsets[page] + index * SLOT_SIZE)
+                f.write(tile.tobytes())
+                entries[key] = (check, slots[key], width, height)
+
+            self.write_index(f, end, entries, page_offsets)
+
+    def write_index(self, f, index_offset: int, entries: dict[ThumbnailKey, tuple[int, int, int, int]],
+                    page_offsets: list[int]):
+        f.seek(index_offset)
+        for offset in page_offsets:
+            f.write(PAGE_OFFSET.pack(offset))
+        for key, (check, slot, width, height) in entries.items():
+            f.write(THUMBNAIL_ENTRY.pack(*key, check, slot, width, height))
+        f.flush()
+        os.fsync(f.fileno())
+
+        f.seek(0)
+        f.write(THUMBNAIL_HEADER.pack(THUMBNAIL_MAGIC, THUMBNAIL_VERSION, self.rom_hash, index_offset,
+                                      len(page_offsets), len(entries)))
+
+    # Copies the thumbnails into a new file without the old indexes that
+    # replaces the old one. Only done on open, get hands out copies.
+    def compact(self):
+        temp_path = self.path + ".tmp"
+        entries = {}
+        page_offsets = []
+        with open(temp_path, "w+b") as f:
+            end = PAGES_OFFSET
+            for slot, (key, (check, old_slot, width, height)) in enumerate(self.entries.items()):
+                page, index = divmod(slot, PAGE_SLOTS)
+                if page == len(page_offsets):
+                    page_offsets.append(end)
+                    end += PAGE_SIZE
+                    f.truncate(end)
+                old_page, old_index = divmod(old_slot, PAGE_SLOTS)
+                f.seek(page_offsets[page] + index * SLOT_SIZE)
+                f.write(self.pages[old_page][old_index].tobytes())
+                entries[key] = (check, slot, width, height)
+            self.write_index(f, end, entries, page_offsets)
+
+        self.pages = []
+        self.mapping.close()
+        self.mapping = None
+        os.replace(temp_path, self.path)
+        self.load()
+
+
+thumbnail_cache = ThumbnailCache()
+
+
+# Decoded pixels, index streams and plans kept in memory, least recently
+# used first. Entries are evicted once their total size is over budget,
+# pinned keys stay until unpinned. Whoever puts an entry has to be able to
+# make it again when get misses. The GUI fills it from a loader thread.
+class MemoryCache:
+    def __init__(self, budget: int):
+        self.budget: int = budget
+        self.size: int = 0
+        self.entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+        self.pinned: dict[tuple, int] = {}
+        self.lock: threading.RLock = threading.RLock()
+
+    def get(self, key: tuple):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key: tuple, value, size: int):
+        with self.lock:
+            self.discard(key)
+            self.entries[key] = (value, size)
+            self.size += size
+            # Never the entry just put, it is about to be used
+            self.evict(key)
+
+    def discard(self, key: tuple):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+    def pin(self, key: tuple):
+        with self.lock:
+            self.pinned[key] = self.pinned.get(key, 0) + 1
+
+    # Keys that are not pinned are left alone
+    def unpin(self, key: tuple):
+        with self.lock:
+            if key not in self.pinned:
+                return
+            self.pinned[key] -= 1
+            if not self.pinned[key]:
+                del self.pinned[key]
+                self.evict()
+
+    def evict(self, keep: tuple = None):
+        with self.lock:
+            if self.size <= self.budget:
+                return
+            for key in list(self.entries):
+                if key not in self.pinned and key != keep:
+                    self.discard(key)
+                    if self.size <= self.budget:
+                        return
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+# A quarter of the budget is left to the pixmaps and icons of the GUI
+memory_cache = MemoryCache(get_memory_budget() * 3 // 4)
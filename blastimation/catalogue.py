@@ -0,0 +1,57 @@
+import numpy as np
+
+from blastimation.blast import Blast
+
+
+# Every image of a ROM as one row of NumPy columns, sorted by address.
+# BlastImage is a view onto a row, so aggregates, sorting and filtering
+# over the whole ROM are array operations.
+class Catalogue:
+    def __init__(self, data: memoryview = memoryview(b""), address=(), blast=(), offset=(), encoded_size=(),
+                 width=None, height=None, lut=None):
+        address = np.asarray(address, dtype=np.int64)
+        order = np.argsort(address, kind="stable")
+        # Like assigning to a dict, the last entry of an address wins
+        order = order[np.append(address[order][1:] != address[order][:-1], True)] if len(order) else order
+        size = len(order)
+
+        # Encoded bytes of a row are data[offset:offset + encoded_size]
+        self.data: memoryview = data
+        self.address: np.ndarray = np.asarray(address, dtype=np.uint32)[order]
+        self.blast: np.ndarray = np.asarray(blast, dtype=np.uint8)[order]
+        self.offset: np.ndarray = np.asarray(offset, dtype=np.uint32)[order]
+        self.encoded_size: np.ndarray = np.asarray(encoded_size, dtype=np.uint32)[order]
+        self.decoded_size: np.ndarray = np.zeros(size, dtype=np.uint32)
+        self.width: np.ndarray = np.zeros(size, dtype=np.uint16) if width is None \
+            else np.asarray(width, dtype=np.uint16)[order]
+        self.height: np.ndarray = np.zeros(size, dtype=np.uint16) if height is None \
+            else np.asarray(height, dtype=np.uint16)[order]
+        self.lut: np.ndarray = np.zeros(size, dtype=np.uint32) if lut is None \
+            else np.asarray(lut, dtype=np.uint32)[order]
+        # Bumped whenever the decoded pixels of a row are replaced
+        self.version: np.ndarray = np.zeros(size, dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return len(self.address)
+
+    def encoded(self, row: int) -> memoryview:
+        offset = int(self.offset[row])
+        return self.data[offset:offset + int(self.encoded_size[row])]
+
+    def rows(self, addresses) -> np.ndarray:
+        rows = np.searchsorted(self.address, addresses)
+        assert np.all(rows < len(self)) and np.all(self.address[rows] == addresses), "Address not in catalogue"
+        return rows
+
+    def select(self, rows: np.ndarray = None, blast: Blast = None,
+               start: int = None, end: int = None) -> np.ndarray:
+        if rows is None:
+            rows = np.arange(len(self))
+        mask = np.ones(len(rows), dtype=bool)
+        if blast:
+            mask &= self.blast[rows] == blast.value
+        if start is not None:
+            mask &= self.address[rows] >= start
+        if end is not None:
+            mask &= self.address[rows] <= end
+        return rows[mask]
@@ -0,0 +1,43 @@
+import time
+
+from blastimation.blast import Blast, blast_get_lut_size, blast_has_lut, decode_blast, decode_blast_lookup, \
+    execute_plan, make_plan
+from blastimation.lut import luts, get_lut_table
+from blastimation.rom import rom
+
+rom.load("blastcorps.us.v11.assets.yaml")
+
+
+def decode_reference(image):
+    if blast_has_lut(image.blast):
+        lut = luts[blast_get_lut_size(image.blast)][image.lut]
+        return decode_blast_lookup(image.blast, image.encoded, lut, use_tables=False)
+    return decode_blast(image.blast, image.encoded, use_tables=False)
+
+
+def decode_tables(image):
+    if blast_has_lut(image.blast):
+        return execute_plan(make_plan(image.blast, image.encoded), get_lut_table(image.blast, image.lut))
+    return decode_blast(image.blast, image.encoded)
+
+
+print("%-14s %6s %10s %12s %12s %8s" % ("Type", "Images", "Encoded", "Reference", "Tables", "Speedup"))
+
+for blast_type in [Blast.BLAST1_RGBA16, Blast.BLAST2_RGBA32, Blast.BLAST3_IA8,
+                   Blast.BLAST4_IA16, Blast.BLAST5_RGBA32, Blast.BLAST6_IA8]:
+    images = [i for i in rom.images.values() if i.blast == blast_type]
+    encoded_size = sum(i.encoded_size for i in images)
+
+    start = time.perf_counter()
+    reference = [decode_reference(i) for i in images]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tables = [decode_tables(i) for i in images]
+    tables_time = time.perf_counter() - start
+
+    assert reference == tables
+
+    print("%-14s %6d %10d %10.1fms %10.1fms %7.1fx" % (
+        blast_type.name, len(images), encoded_size,
+        reference_time * 1000, tables_time * 1000, reference_time / tables_time))
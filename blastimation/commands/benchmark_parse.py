@@ -0,0 +1,42 @@
+import functools
+import random
+import timeit
+
+import numpy as np
+
+from blastimation.blast import Blast, blast_parse_rgba
+from blastimation.tex64 import parse_rgba16, parse_ia8, parse_rgba32
+
+# The reference parsers against the RGBA8888 parsers the app renders with
+parsers = [
+    ("rgba16", 2, parse_rgba16, Blast.BLAST1_RGBA16),
+    ("ia8", 1, parse_ia8, Blast.BLAST3_IA8),
+    ("rgba32", 4, parse_rgba32, Blast.BLAST2_RGBA32),
+]
+
+
+# IA8 references give intensity and alpha, the app repeats the intensity
+def reference_rgba(name: str, pixels) -> bytes:
+    pixels = np.frombuffer(bytes(pixels), dtype=np.uint8)
+    if name == "ia8":
+        pixels = pixels.reshape(-1, 2)[:, [0, 0, 0, 1]]
+    return pixels.tobytes()
+
+
+rng = random.Random(0)
+
+print("%-8s %9s %12s %12s %8s" % ("Format", "Size", "Reference", "Tables", "Speedup"))
+
+for name, bytes_per_pixel, reference, blast_type in parsers:
+    tables = functools.partial(blast_parse_rgba, blast_type)
+    for width, height in [(64, 64), (128, 128), (256, 256)]:
+        data = rng.randbytes(width * height * bytes_per_pixel)
+        assert reference_rgba(name, reference(data, width, height, False, True)) == \
+            tables(data, width, height, False, True).tobytes()
+
+        runs = 5
+        reference_time = timeit.timeit(lambda: reference(data, width, height, False, True), number=runs) / runs
+        tables_time = timeit.timeit(lambda: tables(data, width, height, False, True), number=runs) / runs
+
+        print("%-8s %9s %10.2fms %10.3fms %7.0fx" % (
+            name, "%dx%d" % (width, height), reference_time * 1000, tables_time * 1000, reference_time / tables_time))
@@ -1,92 +1,110 @@
-import io
+import argparse
 import os
 import shutil
 import subprocess
 
-from PySide6.QtCore import QBuffer
-from PySide6.QtWidgets import QApplication
-
+from blastimation.cache import decode_cache
 from blastimation.comp import CompType
+from blastimation.filter import FilterIndex, comp_columns
 from blastimation.gif_converter import TransparentAnimatedGifConverter
 from blastimation.meta import Meta
 from blastimation.rom import rom
 
 from PIL import Image
 
-rom.load("blastcorps.us.v11.assets.yaml")
-
-os.makedirs("export/gif", exist_ok=True)
-os.makedirs("export/png", exist_ok=True)
-
-do_webp = False
-img2webp_path = shutil.which("img2webp")
-if img2webp_path:
-    do_webp = True
-    os.makedirs("export/webp", exist_ok=True)
-else:
-    print("If you want to export animated WebP, install img2webp (from libwebp).")
-
-do_apng = False
-apngasm_path = shutil.which("apngasm")
-if img2webp_path:
-    do_apng = True
-    os.makedirs("export/apng", exist_ok=True)
-else:
-    print("If you want to export animated WebP, install apngasm.")
-
-meta = Meta()
-
-QApplication()
-
-for addr, comp in meta.comps.items():
-    if comp.type in [CompType.Animation, CompType.AnimationComp]:
-        print("%06X" % addr, comp.frames())
-        frame_pixmaps = []
-        for i in range(comp.frames()):
-            match comp.type:
-                case CompType.Animation:
-                    frame_addr = comp.addresses[i]
-                    image = rom.images[frame_addr]
-                    image.decode()
-                    frame_pixmaps.append(image.pixmap)
-                case CompType.AnimationComp:
-                    image = comp.comps[i].get_image()
-                    frame_pixmaps.append(image.pixmap)
-
-        i = 0
-        pngs = []
-        for pixmap in frame_pixmaps:
-            png_path = 'export/png/%06X.%02d.png' % (addr, i)
-            pixmap.save(png_path)
-            pngs.append(png_path)
-            i += 1
-
-        if do_webp:
-            command = ["img2webp"]
-            command.extend(pngs)
-            command.extend(["-o", "export/webp/%06X.webp" % addr])
-            subprocess.run(command)
-
-        if do_apng:
-            command = ["apngasm", "export/apng/%06X.png" % addr]
-            command.extend(pngs)
-            subprocess.run(command)
-
-        images = []
-        for pixmap in frame_pixmaps:
-            buffer = QBuffer()
-            buffer.open(QBuffer.ReadWrite)
-            pixmap.save(buffer, "PNG")
-
-            im = Image.open(io.BytesIO(buffer.data()))
-            im2 = im.convert(mode='RGBA')
-            converter = TransparentAnimatedGifConverter(img_rgba=im2)
-            thumbnail_p = converter.process()
-            images.append(thumbnail_p)
-
-        images[0].save('export/gif/%06X.gif' % addr,
-                       save_all=True, append_images=images[1:],
-                       optimize=False,
-                       disposal=2,
-                       loop=0,
-                       transparency=0)
+
+def print_progress(done: int, total: int):
+    print("Decoded %d/%d" % (done, total), end="\r" if done < total else "\n")
+
+
+def hex_address(text: str) -> int:
+    try:
+        return int(text, 16)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text} is not a hex address")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the animations as GIF, PNG, WebP and APNG")
+    parser.add_argument("--range", nargs=2, type=hex_address, metavar=("START", "END"),
+                        help="only the animations starting in [START, END], hex addresses")
+    args = parser.parse_args()
+
+    rom.load("blastcorps.us.v11.assets.yaml")
+
+    os.makedirs("export/gif", exist_ok=True)
+    os.makedirs("export/png", exist_ok=True)
+
+    do_webp = False
+    img2webp_path = shutil.which("img2webp")
+    if img2webp_path:
+        do_webp = True
+        os.makedirs("export/webp", exist_ok=True)
+    else:
+        print("If you want to export animated WebP, install img2webp (from libwebp).")
+
+    do_apng = False
+    apngasm_path = shutil.which("apngasm")
+    if img2webp_path:
+        do_apng = True
+        os.makedirs("export/apng", exist_ok=True)
+    else:
+        print("If you want to export animated WebP, install apngasm.")
+
+    meta = Meta()
+
+    criteria = {"comp": [CompType.Animation.value, CompType.AnimationComp.value],
+                "address": tuple(args.range) if args.range else None}
+    columns = comp_columns(list(meta.comps.values()))
+    selected = set(columns["address"][FilterIndex(columns).select(criteria)].tolist())
+    animation_addresses = [address for address, (comp, frame) in meta.members.items() if comp.start() in selected]
+
+    for frame_addr, raw in rom.decode_batch(animation_addresses, parse=True, progress=print_progress).items():
+        rom.images[frame_addr].set_rgba(raw)
+    decode_cache.save()
+
+    for addr, comp in meta.comps.items():
+        if addr in selected:
+            print("%06X" % addr, comp.frames())
+            frame_images = []
+            for i in range(comp.frames()):
+                image = comp.get_frame(i)
+                # Shares the decoded RGBA rows
+                frame_images.append(Image.frombuffer("RGBA", (image.width, image.height), image.rgba,
+                                                     "raw", "RGBA", 0, 1))
+
+            i = 0
+            pngs = []
+            for im in frame_images:
+                png_path = 'export/png/%06X.%02d.png' % (addr, i)
+                im.save(png_path)
+                pngs.append(png_path)
+                i += 1
+
+            if do_webp:
+                command = ["img2webp"]
+                command.extend(pngs)
+                command.extend(["-o", "export/webp/%06X.webp" % addr])
+                subprocess.run(command)
+
+            if do_apng:
+                command = ["apngasm", "export/apng/%06X.png" % addr]
+                command.extend(pngs)
+                subprocess.run(command)
+
+            images = []
+            for im in frame_images:
+                converter = TransparentAnimatedGifConverter(img_rgba=im)
+                thumbnail_p = converter.process()
+                images.append(thumbnail_p)
+
+            images[0].save('export/gif/%06X.gif' % addr,
+                           save_all=True, append_images=images[1:],
+                           optimize=False,
+                           disposal=2,
+                           loop=0,
+                           transparency=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
+import threading
 from enum import Enum
 
-from PySide6.QtCore import QPoint
-from PySide6.QtGui import QImage, QColor, QPainter, QPixmap
+import numpy as np
 
 from blastimation.blast import blast_get_format_id, Blast
 from blastimation.image import BlastImage
@@ -17,46 +17,55 @@ class CompType(Enum):
     AnimationComp = 5
 
 
+# Tiles never overlap, so copying them is the same as painting them
+# over the transparent composite. Parts outside of it are clipped.
+def paste(dst: np.ndarray, src: np.ndarray, x: int, y: int):
+    h = min(src.shape[0], dst.shape[0] - y)
+    w = min(src.shape[1], dst.shape[1] - x)
+    dst[y:y + h, x:x + w] = src[:h, :w]
+
+
 class Composite:
     def __init__(self):
         self.name: str = ""
         self.addresses: list[int] = []
         self.type: CompType = CompType.Single
-
-    def blast(self):
-        return rom.images[self.start()].blast
+        # Assembled image, and the (lut, version) of the tiles it was made from
+        self.image: BlastImage = None
+        self.tile_versions: list[tuple[int, int]] = []
+        # Assembly reuses the buffer, icons are assembled on decode workers
+        self.lock: threading.Lock = threading.Lock()
+
+        # Aggregates of the member images, filled by update
+        self.blast: Blast = Blast.BLAST0
+        self.width: int = 0
+        self.height: int = 0
+        self.lut: int = 0
+        self.encoded_size: int = 0
+        self.decoded_size: int = 0
+
+    def update(self):
+        rows = rom.rows(self.addresses)
+        first = rows[0]
+        self.blast = Blast(int(rom.catalogue.blast[first]))
+        self.lut = int(rom.catalogue.lut[first])
+        self.encoded_size = int(rom.catalogue.encoded_size[rows].sum())
+        self.decoded_size = int(rom.catalogue.decoded_size[rows].sum())
+
+        self.width = int(rom.catalogue.width[first])
+        self.height = int(rom.catalogue.height[first])
+        match self.type:
+            case CompType.TopBottom:
+                self.height *= 2
+            case CompType.RightLeft:
+                self.width *= 2
+            case CompType.Quad:
+                self.width *= 2
+                self.height *= 2
 
     def start(self):
         return self.addresses[0]
 
-    def width(self):
-        w = rom.images[self.start()].width
-        match self.type:
-            case (CompType.RightLeft | CompType.Quad):
-                return w * 2
-            case _:
-                return w
-
-    def height(self):
-        h = rom.images[self.start()].height
-        match self.type:
-            case (CompType.TopBottom | CompType.Quad):
-                return h * 2
-            case _:
-                return h
-
-    def encoded_size(self):
-        size = 0
-        for a in self.addresses:
-            size += rom.images[a].encoded_size
-        return size
-
-    def decoded_size(self):
-        size = 0
-        for a in self.addresses:
-            size += rom.images[a].decoded_size
-        return size
-
     def frames(self):
         match self.type:
             case CompType.Animation:
@@ -68,27 +77,32 @@ class Composite:
         return [
             "0x%06X" % self.start(),
             self.name,
-            self.blast().name,
-            blast_get_format_id(self.blast()),
-            self.width(),
-            self.height(),
-            self.encoded_size(),
-            self.decoded_size(),
+            self.blast.name,
+            blast_get_format_id(self.blast),
+            self.width,
+            self.height,
+            self.encoded_size,
+            self.decoded_size,
             self.type.name,
             self.frames()
         ]
 
-    def lut(self):
-        return rom.images[self.start()].lut
-
     def set_lut(self, lut: int):
         assert lut != 0
-        assert self.blast() in [Blast.BLAST4_IA16, Blast.BLAST5_RGBA32]
-        if lut == self.lut():
+        assert self.blast in [Blast.BLAST4_IA16, Blast.BLAST5_RGBA32]
+        if lut == self.lut:
             return
         for a in self.addresses:
             rom.images[a].lut = lut
             rom.images[a].decode(force=True)
+        self.update()
+
+    def get_frame(self, frame: int) -> BlastImage:
+        match self.type:
+            case CompType.Animation:
+                return rom.images[self.addresses[frame]]
+            case _:
+                return self.get_image()
 
     def get_image(self):
         match self.type:
@@ -100,47 +114,44 @@ class Composite:
     def get_comp_image(self) -> BlastImage:
         assert self.type in [CompType.TopBottom, CompType.RightLeft, CompType.Quad]
 
-        images = []
-        for addr in self.addresses:
-            i = rom.images[addr]
-            i.decode()
-            images.append(i)
-
-        match self.type:
-            case CompType.TopBottom:
-                width = images[0].width
-                height = images[0].height * 2
-            case CompType.RightLeft:
-                width = images[0].width * 2
-                height = images[0].height
-            case CompType.Quad:
-                width = images[0].width * 2
-                height = images[0].height * 2
-            case _:
-                width = 0
-                height = 0
-
-        composite_image = QImage(width, height, QImage.Format_ARGB32)
-        composite_image.fill(QColor(0, 0, 0, 0))
-
-        painter = QPainter(composite_image)
-
-        match self.type:
-            case CompType.TopBottom:
-                painter.drawImage(QPoint(0, 0), images[1].qimage)
-                painter.drawImage(QPoint(0, int(height/2)), images[0].qimage)
-            case CompType.RightLeft:
-                painter.drawImage(QPoint(0, 0), images[1].qimage)
-                painter.drawImage(QPoint(int(width / 2), 0), images[0].qimage)
-            case CompType.Quad:
-                painter.drawImage(QPoint(0, 0), images[2].qimage)
-                painter.drawImage(QPoint(int(width / 2), 0), images[3].qimage)
-                painter.drawImage(QPoint(0, int(height / 2)), images[0].qimage)
-                painter.drawImage(QPoint(int(width / 2), int(height / 2)), images[1].qimage)
-
-        painter.end()
-
-        image = BlastImage(self.blast(), self.start(), b"", width, height)
-        image.pixmap = QPixmap.fromImage(composite_image)
-
-        return image
+        with self.lock:
+            images = []
+            for addr in self.addresses:
+                i = rom.images[addr]
+                i.decode()
+                images.append(i)
+
+            tile_versions = [(i.lut, i.version) for i in images]
+            if self.image is not None and tile_versions == self.tile_versions:
+                return self.image
+
+            # Decoding can change the sizes of the tiles
+            self.update()
+            width = self.width
+            height = self.height
+
+            # Reuses the buffer of the last assembly
+            if self.image is None or (self.image.width, self.image.height) != (width, height):
+                self.image = BlastImage(self.blast, self.start(), b"", width, height)
+                composite = np.zeros((height, width, 4), dtype=np.uint8)
+            else:
+                composite = self.image.composite
+                composite.fill(0)
+
+            match self.type:
+                case CompType.TopBottom:
+                    paste(composite, images[1].rgba, 0, 0)
+                    paste(composite, images[0].rgba, 0, int(height / 2))
+                case CompType.RightLeft:
+                    paste(composite, images[1].rgba, 0, 0)
+                    paste(composite, images[0].rgba, int(width / 2), 0)
+                case CompType.Quad:
+                    paste(composite, images[2].rgba, 0, 0)
+                    paste(composite, images[3].rgba, int(width / 2), 0)
+                    paste(composite, images[0].rgba, 0, int(height / 2))
+                    paste(composite, images[1].rgba, int(width / 2), int(height / 2))
+
+            self.image.set_rgba(composite)
+            # Reading rgba can decode evicted tiles again
+            self.tile_versions = [(i.lut, i.version) for i in images]
+            return self.image
@@ -0,0 +1,104 @@
+import numpy as np
+
+from blastimation.blast import Blast, blast_get_format_id
+from blastimation.catalogue import Catalogue
+
+# Format id of each Blast value
+FORMAT_IDS = np.array([blast_get_format_id(b) for b in Blast])
+
+# A value, an inclusive (low, high) range with None for an open side, or
+# a list of values
+Criterion = object
+
+
+# Columns of the catalogue rows, as the browser and exports filter them
+def image_columns(catalogue: Catalogue, rows: np.ndarray) -> dict[str, np.ndarray]:
+    return {
+        "address": catalogue.address[rows],
+        "blast": catalogue.blast[rows],
+        "format": FORMAT_IDS[catalogue.blast[rows]],
+        "width": catalogue.width[rows],
+        "height": catalogue.height[rows],
+        "encoded_size": catalogue.encoded_size[rows],
+        "decoded_size": catalogue.decoded_size[rows],
+    }
+
+
+def comp_columns(comps: list) -> dict[str, np.ndarray]:
+    return {
+        "address": np.array([c.start() for c in comps], dtype=np.uint32),
+        "name": np.array([c.name for c in comps], dtype=str),
+        "blast": np.array([c.blast.value for c in comps], dtype=np.uint8),
+        "format": np.array([blast_get_format_id(c.blast) for c in comps], dtype=str),
+        "width": np.array([c.width for c in comps], dtype=np.uint16),
+        "height": np.array([c.height for c in comps], dtype=np.uint16),
+        "encoded_size": np.array([c.encoded_size for c in comps], dtype=np.uint32),
+        "decoded_size": np.array([c.decoded_size for c in comps], dtype=np.uint32),
+        "comp": np.array([c.type.value for c in comps], dtype=np.uint8),
+        "frames": np.array([c.frames() for c in comps], dtype=np.uint32),
+    }
+
+
+# Every column sorted once, with the rows in that order. A criterion is
+# two binary searches into its sorted column. Criteria are combined by
+# taking the rows of the one matching the fewest and testing the others
+# on those rows only, so selecting costs the matching rows rather than a
+# scan of the whole table.
+class FilterIndex:
+    def __init__(self, columns: dict[str, np.ndarray]):
+        self.size: int = len(next(iter(columns.values()))) if columns else 0
+        self.columns: dict[str, np.ndarray] = {}
+        # column -> (rows in sorted order, sorted values)
+        self.indexes: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for name, column in columns.items():
+            column = np.asarray(column)
+            assert len(column) == self.size, f"Column {name} has {len(column)} rows, not {self.size}"
+            order = np.argsort(column, kind="stable")
+            self.columns[name] = column
+            self.indexes[name] = (order, column[order])
+
+    def match(self, name: str, criterion: Criterion) -> np.ndarray:
+        assert name in self.indexes, f"No column {name}"
+        order, values = self.indexes[name]
+        match criterion:
+            case list() | set():
+                return np.concatenate([self.match(name, (v, v)) for v in set(criterion)] or
+                                      [np.zeros(0, dtype=order.dtype)])
+            case tuple((low, high)):
+                start = 0 if low is None else np.searchsorted(values, low, "left")
+                end = len(values) if high is None else np.searchsorted(values, high, "right")
+                return order[start:end]
+            case _:
+                return self.match(name, (criterion, criterion))
+
+    # Which of rows match, without going through the index
+    def test(self, name: str, criterion: Criterion, rows: np.ndarray) -> np.ndarray:
+        assert name in self.columns, f"No column {name}"
+        values = self.columns[name][rows]
+        match criterion:
+            case list() | set():
+                return np.isin(values, list(criterion))
+            case tuple((low, high)):
+                mask = np.ones(len(values), dtype=bool)
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+                return mask
+            case _:
+                return values == criterion
+
+    # Rows matching every criterion in ascending order, None criteria are
+    # left out
+    def select(self, criteria: dict[str, Criterion] = None) -> np.ndarray:
+        criteria = {name: criterion for name, criterion in (criteria or {}).items() if criterion is not None}
+        if not criteria:
+            return np.arange(self.size)
+
+        matches = {name: self.match(name, criterion) for name, criterion in criteria.items()}
+        fewest = min(matches, key=lambda name: len(matches[name]))
+        rows = matches[fewest]
+        for name, criterion in criteria.items():
+            if name != fewest and len(rows):
+                rows = rows[self.test(name, criterion, rows)]
+        return np.sort(rows)
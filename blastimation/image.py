@@ -1,29 +1,88 @@
-from PySide6.QtGui import QImage, QPixmap
+import zlib
 
-from blastimation.blast import Blast, blast_guess_resolution, blast_parse_image, decode_blast, decode_blast_lookup, \
-    blast_get_format_id, blast_get_lut_size
-from blastimation.lut import luts
+import numpy as np
 
+from blastimation.blast import Blast, blast_guess_resolution, blast_parse_rgba, blast_get_format_id, \
+    blast_decoded_size, blast_get_lut_size, blast_has_lut, blast_literal_table, BlastPlan, make_plan, \
+    execute_plan_indices, blast_check_lookup
+from blastimation.cache import CacheKey, decode_cache, memory_cache
+from blastimation.catalogue import Catalogue
+from blastimation.lut import luts, get_lut_table, get_lut_rgba_table
+from blastimation.pipeline import blast_literal_rgba_table, render_indices, render_plan
 
-class BlastImage:
-    def __init__(self, blast_type: Blast, address: int, encoded: bytes = b"",
-                 width: int = 0, height: int = 0):
-        self.address: int = address
-        self.width: int = width
-        self.height: int = height
-        self.lut: int = 0
-
-        self.blast: Blast = blast_type
-        self.encoded: bytes = encoded
 
-        if encoded:
-            self.encoded_size: int = len(encoded)
-        else:
-            self.encoded_size: int = 0
-        self.decoded_size: int = 0
+class BlastImage:
+    __slots__ = ("catalogue", "row", "composite")
 
-        self.pixmap: QPixmap = None
-        self.qimage: QImage = None
+    def __init__(self, blast_type: Blast, address: int, encoded: bytes | memoryview = b"",
+                 width: int = 0, height: int = 0):
+        # Images outside of a ROM get a catalogue of their own
+        self.catalogue: Catalogue = Catalogue(memoryview(encoded), [address], [blast_type.value], [0],
+                                              [len(encoded)], [width], [height])
+        self.row: int = 0
+
+        # Composites can't be decoded again, so they keep their own pixels
+        self.composite: np.ndarray = None
+
+    @classmethod
+    def view(cls, catalogue: Catalogue, row: int) -> "BlastImage":
+        image = cls.__new__(cls)
+        image.catalogue = catalogue
+        image.row = row
+        image.composite = None
+        return image
+
+    @property
+    def address(self) -> int:
+        return int(self.catalogue.address[self.row])
+
+    @property
+    def blast(self) -> Blast:
+        return Blast(int(self.catalogue.blast[self.row]))
+
+    @property
+    def encoded(self) -> memoryview:
+        return self.catalogue.encoded(self.row)
+
+    @property
+    def encoded_size(self) -> int:
+        return int(self.catalogue.encoded_size[self.row])
+
+    @property
+    def decoded_size(self) -> int:
+        return int(self.catalogue.decoded_size[self.row])
+
+    @decoded_size.setter
+    def decoded_size(self, value: int):
+        self.catalogue.decoded_size[self.row] = value
+
+    @property
+    def width(self) -> int:
+        return int(self.catalogue.width[self.row])
+
+    @width.setter
+    def width(self, value: int):
+        self.catalogue.width[self.row] = value
+
+    @property
+    def height(self) -> int:
+        return int(self.catalogue.height[self.row])
+
+    @height.setter
+    def height(self, value: int):
+        self.catalogue.height[self.row] = value
+
+    @property
+    def lut(self) -> int:
+        return int(self.catalogue.lut[self.row])
+
+    @lut.setter
+    def lut(self, value: int):
+        self.catalogue.lut[self.row] = value
+
+    @property
+    def version(self) -> int:
+        return int(self.catalogue.version[self.row])
 
     def model_data(self):
         return [
@@ -37,45 +96,107 @@ class BlastImage:
             self.decoded_size
         ]
 
-    def decode(self, force=False):
-        if self.pixmap and not force:
-            return
+    # (height, width, 4) RGBA8888 rows in display order, decoded again if
+    # they were evicted from the memory cache
+    @property
+    def rgba(self) -> np.ndarray:
+        return self.decode()
+
+    def memory_key(self, kind: str, lut: int = None) -> tuple:
+        return (kind, self.address, self.blast.value, self.width, self.height, self.lut if lut is None else lut)
+
+    # Plans and index streams only depend on the encoded bytes, not on the
+    # size or LUT
+    def stream_key(self, kind: str) -> tuple:
+        return (kind, self.address, self.blast.value, self.encoded_size, zlib.crc32(self.encoded))
+
+    # The LUT is read once, the GUI can change it while a worker decodes
+    def decode(self, force=False) -> np.ndarray:
+        if self.composite is not None:
+            return self.composite
+        lut = self.lut
+        if not force:
+            rgba = memory_cache.get(self.memory_key("rgba", lut))
+            if rgba is not None:
+                return rgba
 
         assert self.encoded
 
-        match self.blast:
-            case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
-                lut_size = blast_get_lut_size(self.blast)
-                decoded = decode_blast_lookup(self.blast, self.encoded, luts[lut_size][self.lut])
-            case _:
-                decoded = decode_blast(self.blast, self.encoded)
-
-        self.decoded_size = len(decoded)
-
         if not self.width or not self.height:
-            self.guess_resolution(decoded)
-        raw = self.parse(decoded)
-        self.generate_pixmap(raw)
+            self.measure()
 
-    def guess_resolution(self, decoded: bytes):
-        self.width, self.height = blast_guess_resolution(self.blast, len(decoded))
+        key, check = self.cache_key(lut)
+        rgba = decode_cache.get(key, check)
+        if rgba is None:
+            rgba = self.render(lut)
+            decode_cache.put(key, check, rgba)
 
-    def parse(self, decoded: bytes) -> bytes:
-        return blast_parse_image(self.blast, decoded, self.width, self.height, False, True)
+        return self.set_rgba(rgba, lut)
 
-    def generate_pixmap(self, raw: bytes):
+    # RGBA8888 rows, already flipped for display
+    def render(self, lut: int = None) -> np.ndarray:
+        lut = self.lut if lut is None else lut
         match self.blast:
-            case (Blast.BLAST6_IA8 | Blast.BLAST3_IA8 | Blast.BLAST4_IA16):
-                bytes_per_pixel = 2
-                image_format = QImage.Format_Grayscale16
+            case Blast.BLAST0:
+                rgba = blast_parse_rgba(self.blast, self.encoded, self.width, self.height, False, True)
+                self.decoded_size = len(self.encoded)
+                return rgba
+            case (Blast.BLAST4_IA16 | Blast.BLAST5_RGBA32):
+                # Decompressed LUT indices, so a LUT change is only a remap
+                rgba_table = get_lut_rgba_table(self.blast, lut)
+                indices_key = self.stream_key("indices")
+                indices = memory_cache.get(indices_key)
+                plan = self.get_plan()
+                blast_check_lookup(self.blast, plan, luts[blast_get_lut_size(self.blast)][lut])
+                if indices is None and plan.aligned and self.width % rgba_table.shape[1] == 0:
+                    indices = execute_plan_indices(plan)
+                    memory_cache.put(indices_key, indices, indices.nbytes)
+                if indices is not None:
+                    rgba = render_indices(indices, rgba_table, self.width, self.height)
+                else:
+                    rgba = render_plan(self.blast, plan, get_lut_table(self.blast, lut), rgba_table,
+                                       self.width, self.height)
             case _:
-                bytes_per_pixel = 4
-                image_format = QImage.Format_RGBA8888
-
-        self.qimage = QImage(raw, self.width, self.height, bytes_per_pixel * self.width, image_format)
-
-        # Fix grayscale alpha
-        if image_format == QImage.Format_Grayscale16:
-            self.qimage.setAlphaChannel(self.qimage)
-
-        self.pixmap = QPixmap.fromImage(self.qimage)
+                rgba = render_plan(self.blast, self.get_plan(), blast_literal_table(self.blast),
+                                   blast_literal_rgba_table(self.blast), self.width, self.height)
+
+        self.decoded_size = self.get_plan().size
+        return rgba
+
+    # Entries are keyed by what changes the parsed pixels, and checked
+    # against the encoded and LUT bytes they were decoded from.
+    def cache_key(self, lut: int = None) -> tuple[CacheKey, int]:
+        lut = self.lut if lut is None else lut
+        check = zlib.crc32(self.encoded)
+        if blast_has_lut(self.blast):
+            check = zlib.crc32(luts[blast_get_lut_size(self.blast)][lut], check)
+        return (self.address, self.blast.value, self.width, self.height, lut), check
+
+    # Parsed command stream, kept so re-decoding with another LUT skips parsing
+    def get_plan(self) -> BlastPlan:
+        key = self.stream_key("plan")
+        plan = memory_cache.get(key)
+        if plan is None:
+            plan = make_plan(self.blast, self.encoded)
+            memory_cache.put(key, plan, plan.nbytes)
+        return plan
+
+    def measure(self):
+        self.decoded_size = blast_decoded_size(self.blast, self.encoded)
+        if not self.width or not self.height:
+            self.guess_resolution()
+
+    def guess_resolution(self):
+        self.width, self.height = blast_guess_resolution(self.blast, self.decoded_size)
+
+    # lut is the one the pixels were decoded with
+    def set_rgba(self, rgba, lut: int = None) -> np.ndarray:
+        # Shares the memory of rgba, which is already in display order
+        rgba = np.frombuffer(rgba, dtype=np.uint8).reshape(self.height, self.width, 4)
+        # A new version makes get_pixmap make the pixmap again
+        self.catalogue.version[self.row] += 1
+        if self.encoded:
+            memory_cache.put(self.memory_key("rgba", lut), rgba, rgba.nbytes)
+        else:
+            self.composite = rgba
+        return rgba
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import pickle
+import struct
+
+import numpy as np
+import ryaml
+
+from blastimation.cache import get_cache_dir
+
+INDEX_MAGIC = b"BLSTINDX"
+INDEX_VERSION = 2
+# magic, version, source mtime in ns, source size, source hash, followed
+# by the pickled index
+INDEX_HEADER = struct.Struct(">8sIqQ20s")
+
+SEGMENT_BLAST = 0
+SEGMENT_LUT = 1
+
+SEGMENT_DTYPE = np.dtype([
+    ("start", "<u4"),
+    ("end", "<u4"),
+    ("type", "u1"),
+    ("blast", "u1"),
+    ("width", "<u2"),
+    ("height", "<u2"),
+])
+
+
+class AssetIndex:
+    def __init__(self, target_path: str, segments: np.ndarray):
+        self.target_path: str = target_path
+        self.segments: np.ndarray = segments
+
+
+def compile_assets(yaml_path: str) -> AssetIndex:
+    with open(yaml_path, "r") as f:
+        y = ryaml.load(f)
+
+    segments = []
+    for segment in y["segments"]:
+        if len(segments) > 0:
+            if "end" not in segments[-1]:
+                if isinstance(segment, list):
+                    segments[-1]["end"] = segment[0]
+                elif isinstance(segment, dict):
+                    segments[-1]["end"] = segment["start"]
+
+        if isinstance(segment, dict) or len(segment) == 1:
+            continue
+
+        if segment[1] == "blast" and segment[3] != 0:
+            segment_dict = {
+                "start": segment[0],
+                "blast": segment[3],
+                "width": segment[4],
+                "height": segment[5],
+                "type": SEGMENT_BLAST
+            }
+            segments.append(segment_dict)
+        elif segment[1] == "bin" and len(segment) == 3 and ".lut" in segment[2]:
+            segment_dict = {
+                "start": segment[0],
+                "blast": 0,
+                "width": 0,
+                "height": 0,
+                "type": SEGMENT_LUT
+            }
+            segments.append(segment_dict)
+
+    table = np.array([(s["start"], s["end"], s["type"], s["blast"], s["width"], s["height"]) for s in segments],
+                     dtype=SEGMENT_DTYPE)
+    return AssetIndex(y['options']['target_path'], table)
+
+
+def compile_meta(meta_path: str) -> dict:
+    with open(meta_path, "r") as f:
+        return ryaml.load(f)
+
+
+# Compiled sources are kept next to the decode caches and are only
+# compiled again when the source changed.
+def load_index(source_path: str, compile_fun):
+    index_path = os.path.join(get_cache_dir(),
+                              "index-%s.bin" % hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:16])
+
+    stat = os.stat(source_path)
+    source_hash = None
+
+    try:
+        with open(index_path, "rb") as f:
+            magic, version, mtime, size, index_hash = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic == INDEX_MAGIC and version == INDEX_VERSION:
+                if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+                    return pickle.load(f)
+                # Touched, but maybe not changed
+                with open(source_path, "rb") as source:
+                    source_hash = hashlib.sha1(source.read()).digest()
+                if source_hash == index_hash:
+                    index = pickle.load(f)
+                    _write_index(index_path, stat, source_hash, index)
+                    return index
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Pickles of classes that changed since fail in many ways
+        print(f"Compiling {source_path} again, its index failed to load: {e!r}")
+
+    if source_hash is None:
+        with open(source_path, "rb") as source:
+            source_hash = hashlib.sha1(source.read()).digest()
+
+    index = compile_fun(source_path)
+    _write_index(index_path, stat, source_hash, index)
+    return index
+
+
+def _write_index(index_path: str, stat: os.stat_result, source_hash: bytes, index):
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_mtime_ns, stat.st_size, source_hash))
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, index_path)
+
+
+def load_assets(yaml_path: str) -> AssetIndex:
+    return load_index(yaml_path, compile_assets)
+
+
+def load_meta(meta_path: str) -> dict:
+    return load_index(meta_path, compile_meta)
@@ -1,13 +1,75 @@
-from blastimation.blast import Blast, blast_get_lut_size
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+from blastimation.blast import Blast, blast_get_lut_size, blast_lookup_table
+from blastimation.pipeline import blast_rgba_table
 
 luts = {
     128: {},
     256: {}
 }
 
+# Sorted LUT addresses per size
+lut_addresses = {
+    128: [],
+    256: []
+}
+
+# Expanded literal tables by LUT address, with the LUT bytes they were built from
+lut_tables: dict[int, tuple[Blast, bytes, np.ndarray]] = {}
+# Same for the literal -> RGBA8888 tables
+lut_rgba_tables: dict[int, tuple[Blast, bytes, np.ndarray]] = {}
+
+
+def add_lut(address: int, data: bytes):
+    lut_size = len(data)
+    if address not in luts[lut_size]:
+        insort(lut_addresses[lut_size], address)
+    luts[lut_size][address] = data
+
 
 def get_last_lut(blast: Blast) -> int:
-    lut_size = blast_get_lut_size(blast)
-    lut_keys = list(luts[lut_size].keys())
-    lut_keys.sort()
-    return lut_keys[-1]
+    return lut_addresses[blast_get_lut_size(blast)][-1]
+
+
+# Nearest LUT at or before address, 0 if there is none
+def find_lut(blast: Blast, address: int) -> int:
+    addresses = lut_addresses[blast_get_lut_size(blast)]
+    i = bisect_right(addresses, address)
+    return addresses[i - 1] if i else 0
+
+
+def get_luts_in_range(lut_size: int, start: int, end: int) -> list[int]:
+    addresses = lut_addresses[lut_size]
+    return addresses[bisect_left(addresses, start):bisect_right(addresses, end)]
+
+
+# Position of a LUT in the sorted addresses, as shown in the LUT combo box
+def get_lut_row(lut_size: int, address: int) -> int:
+    addresses = lut_addresses[lut_size]
+    i = bisect_left(addresses, address)
+    assert i < len(addresses) and addresses[i] == address
+    return i
+
+
+def _get_cached_table(tables: dict, blast: Blast, address: int, build_fun) -> np.ndarray:
+    lut = luts[blast_get_lut_size(blast)][address]
+
+    if address in tables:
+        table_blast, table_lut, table = tables[address]
+        if table_blast == blast and (table_lut is lut or table_lut == lut):
+            return table
+
+    table = build_fun(lut)
+    tables[address] = (blast, lut, table)
+    return table
+
+
+def get_lut_table(blast: Blast, address: int) -> np.ndarray:
+    return _get_cached_table(lut_tables, blast, address, lambda lut: blast_lookup_table(blast, lut))
+
+
+def get_lut_rgba_table(blast: Blast, address: int) -> np.ndarray:
+    return _get_cached_table(lut_rgba_tables, blast, address,
+                             lambda lut: blast_rgba_table(blast, get_lut_table(blast, address)))
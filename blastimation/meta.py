@@ -1,17 +1,16 @@
-import ryaml
-
 from blastimation.animation_comp import AnimationComp
 from blastimation.comp import Composite, CompType
+from blastimation.index import load_meta
 from blastimation.rom import rom
 
 
 class Meta:
     def __init__(self):
-        self.in_comp: list[int] = []
+        # Member address -> owning composite or animation, and frame
+        self.members: dict[int, tuple[Composite | AnimationComp, int]] = {}
         self.comps: dict[int:Composite] = {}
 
-        with open("meta.yaml", "r") as f:
-            composites_yaml = ryaml.load(f)
+        composites_yaml = load_meta("meta.yaml")
 
         for comp_type_str, comp_list in composites_yaml["composites"].items():
             comp_type = getattr(CompType, comp_type_str)
@@ -24,8 +23,9 @@ class Meta:
                 else:
                     c.addresses = addresses
 
-                self.in_comp.extend(c.addresses)
                 self.comps[c.start()] = c
+                for i, address in enumerate(c.addresses):
+                    self.add_member(address, c, i if comp_type == CompType.Animation else 0)
 
                 # Fix LUTs
                 if c.start() in [0x0999E0]:
@@ -46,9 +46,11 @@ class Meta:
                     c.addresses = addresses
                     c.type = comp_type
 
-                    self.in_comp.extend(c.addresses)
                     animation_comp.comps.append(c)
                 self.comps[animation_comp.start()] = animation_comp
+                for frame, c in enumerate(animation_comp.comps):
+                    for address in c.addresses:
+                        self.add_member(address, animation_comp, frame)
 
                 # Fix LUTs
                 if animation_comp.start() in [0x1D0DF8, 0x281C90]:
@@ -56,3 +58,13 @@ class Meta:
                     for comp in animation_comp.comps:
                         for addr in comp.addresses:
                             rom.images[addr].lut = first_lut
+
+        for comp in self.comps.values():
+            comp.update()
+
+    # The first composite listing an address owns it
+    def add_member(self, address: int, comp: Composite | AnimationComp, frame: int):
+        self.members.setdefault(address, (comp, frame))
+
+    def find_comp(self, address: int) -> tuple[Composite | AnimationComp, int] | None:
+        return self.members.get(address)
@@ -0,0 +1,198 @@
+from typing import Callable
+
+import numpy as np
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PySide6.QtGui import QIcon, QImage, QPixmap
+
+from blastimation.blast import Blast
+from blastimation.cache import MemoryCache, get_memory_budget
+from blastimation.comp import CompType
+from blastimation.filter import Criterion, FilterIndex
+from blastimation.image import BlastImage
+from blastimation.playback import scale_rgba
+
+ICON_SIZE = 128
+
+
+# Pixmaps and icons. Qt only allows them on the GUI thread, so unlike
+# memory_cache nothing else puts or evicts them.
+gui_cache = MemoryCache(get_memory_budget() // 4)
+
+
+# Qt objects are only made here, from the RGBA rows the core decodes to.
+# A pixmap is made again once its image has a new version.
+def get_pixmap(image: BlastImage) -> QPixmap:
+    key = image.memory_key("pixmap")
+    entry = gui_cache.get(key)
+    if entry is None or entry[0] != image.version:
+        rgba = image.rgba
+        qimage = QImage(rgba, image.width, image.height, 4 * image.width, QImage.Format_RGBA8888)
+        entry = (image.version, QPixmap.fromImage(qimage))
+        gui_cache.put(key, entry, rgba.nbytes)
+    return entry[1]
+
+
+# Runs on the decode workers, the icon itself is made on the GUI thread
+def render_icon(image: BlastImage) -> np.ndarray:
+    return np.ascontiguousarray(scale_rgba(image.rgba, ICON_SIZE, ICON_SIZE))
+
+
+def address_label(address) -> str:
+    return "0x%06X" % address
+
+
+def blast_label(blast_id) -> str:
+    return Blast(int(blast_id)).name
+
+
+def comp_label(comp_type) -> str:
+    return CompType(int(comp_type)).name
+
+
+# Turn the values of the filter columns into what is displayed
+COLUMN_LABELS = {
+    "address": address_label,
+    "name": str,
+    "blast": blast_label,
+    "format": str,
+    "width": int,
+    "height": int,
+    "encoded_size": int,
+    "decoded_size": int,
+    "comp": comp_label,
+    "frames": int,
+}
+
+
+# Serves rows straight from named columns of values, the first shown one
+# holding the addresses. Filtering selects rows through an index over all
+# the columns and sorting reorders them, cells are only made when a view
+# asks for them. A missing icon is requested
+# from whoever renders them, which either has its pixels at hand or
+# calls set_icon later.
+class CatalogueModel(QAbstractTableModel):
+    # Column name -> header of the columns shown
+    def __init__(self, headers: dict[str, str]):
+        super().__init__()
+        self.names: list[str] = list(headers)
+        self.headers: list[str] = list(headers.values())
+        self.columns: list[np.ndarray] = [np.zeros(0, dtype=np.uint32) for _ in self.names]
+        self.filter_index: FilterIndex = FilterIndex({})
+        # Turn column values into what is displayed
+        self.labels: list[Callable] = []
+        self.get_image: Callable[[int], BlastImage] = None
+        # gui_cache key of the icon of an address
+        self.icon_key: Callable[[int], tuple] = None
+        self.request_icon: Callable[[int], np.ndarray | None] = None
+        self.address_rows: dict[int, int] = {}
+
+        # Rows passing the filter in ascending order
+        self.rows: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.criteria: dict[str, Criterion] = {}
+        # Rows in view order, and the view position of each row or -1
+        self.order: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.positions: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.sort_column: int = 0
+        self.sort_order: Qt.SortOrder = Qt.AscendingOrder
+
+    # Columns that are not shown can still be filtered on. The filter is
+    # kept, criteria on missing columns are left out.
+    def set_rows(self, columns: dict[str, np.ndarray], labels: dict[str, Callable],
+                 get_image: Callable[[int], BlastImage], icon_key: Callable[[int], tuple]):
+        self.beginResetModel()
+        self.columns = [np.asarray(columns[name]) for name in self.names]
+        self.filter_index = FilterIndex(columns)
+        self.labels = [labels[name] for name in self.names]
+        self.get_image = get_image
+        self.icon_key = icon_key
+        self.address_rows = {address: row for row, address in enumerate(self.columns[0].tolist())}
+        self.select()
+        self.endResetModel()
+
+    # Rows matching every criterion, all of them for none
+    def set_filter(self, criteria: dict[str, Criterion] = None):
+        self.beginResetModel()
+        self.criteria = criteria or {}
+        self.select()
+        self.endResetModel()
+
+    def select(self):
+        self.rows = self.filter_index.select({name: criterion for name, criterion in self.criteria.items()
+                                              if name in self.filter_index.indexes})
+        self.update_order()
+
+    def update_order(self):
+        order = np.argsort(self.columns[self.sort_column][self.rows], kind="stable")
+        if self.sort_order == Qt.DescendingOrder:
+            order = order[::-1]
+        self.order = self.rows[order]
+        self.positions = np.full(len(self.columns[0]), -1, dtype=np.int64)
+        self.positions[self.order] = np.arange(len(self.order))
+
+    def address(self, row: int) -> int:
+        return int(self.columns[0][self.order[row]])
+
+    def addresses(self) -> list[int]:
+        return self.columns[0][self.order].tolist()
+
+    @staticmethod
+    def put_icon(key: tuple, rgba: np.ndarray) -> QIcon:
+        height, width = rgba.shape[:2]
+        icon = QIcon(QPixmap.fromImage(QImage(rgba, width, height, 4 * width, QImage.Format_RGBA8888)))
+        gui_cache.put(key, icon, rgba.nbytes)
+        return icon
+
+    def set_icon(self, address: int, key: tuple, rgba: np.ndarray):
+        self.put_icon(key, rgba)
+        self.refresh(address)
+
+    # Repaints the row of address if it is shown
+    def refresh(self, address: int):
+        row = self.address_rows.get(address)
+        if row is None or self.positions[row] < 0:
+            return
+        index = self.index(int(self.positions[row]), 0)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.order[index.row()]
+        match role:
+            case Qt.DisplayRole:
+                return self.labels[index.column()](self.columns[index.column()][row])
+            case Qt.DecorationRole if index.column() == 0:
+                address = int(self.columns[0][row])
+                key = self.icon_key(address)
+                icon = gui_cache.get(key)
+                if icon is None and self.request_icon:
+                    rgba = self.request_icon(address)
+                    if rgba is not None:
+                        icon = self.put_icon(key, rgba)
+                return icon
+        return None
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        rows = [self.order[index.row()] for index in persistent]
+
+        self.sort_column = column
+        self.sort_order = order
+        self.update_order()
+
+        # Keep selections on the same rows
+        self.changePersistentIndexList(persistent, [self.index(int(self.positions[row]), index.column())
+                                                    for row, index in zip(rows, persistent)])
+        self.layoutChanged.emit()
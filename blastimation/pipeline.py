@@ -0,0 +1,55 @@
+import numpy as np
+
+from blastimation.blast import Blast, BlastPlan, blast_get_pixels_per_element, blast_literal_table, \
+    blast_parse_rgba, execute_plan, execute_plan_indices
+from blastimation.tex64 import IA8_RGBA_TABLE, RGBA16_TABLE, image_array
+
+
+# Single pass from the command stream to RGBA8888 rows: the plan runs on
+# the literal words and one gather through a literal -> RGBA table writes
+# the final, flipped pixels.
+
+# (0x8000, pixels per element, 4) RGBA8888 for every literal word
+def blast_rgba_table(blast_type: Blast, table: np.ndarray) -> np.ndarray:
+    match blast_type:
+        case Blast.BLAST1_RGBA16:
+            rgba = RGBA16_TABLE[table]
+        case (Blast.BLAST3_IA8 | Blast.BLAST6_IA8):
+            rgba = IA8_RGBA_TABLE[table.view(np.uint8)]
+        case Blast.BLAST4_IA16:
+            rgba = table.view(np.uint8).reshape(-1, 2, 2)[:, :, [0, 0, 0, 1]]
+        case _:
+            rgba = table.view(np.uint8)
+    return np.ascontiguousarray(rgba).reshape(len(table), blast_get_pixels_per_element(blast_type), 4)
+
+
+_rgba_tables: dict[Blast, np.ndarray] = {}
+
+
+def blast_literal_rgba_table(blast_type: Blast) -> np.ndarray:
+    if blast_type not in _rgba_tables:
+        _rgba_tables[blast_type] = blast_rgba_table(blast_type, blast_literal_table(blast_type))
+    return _rgba_tables[blast_type]
+
+
+def render_indices(indices: np.ndarray, rgba_table: np.ndarray,
+                   width: int, height: int, flip_v: bool = True) -> np.ndarray:
+    pixels_per_element = rgba_table.shape[1]
+    elements = width // pixels_per_element * height
+    if len(indices) < elements:
+        # Missing pixels are transparent like missing bytes, not the colour
+        # of index 0
+        rgba = np.zeros((elements, pixels_per_element, 4), dtype=np.uint8)
+        rgba[:len(indices)] = rgba_table[indices]
+        rgba = rgba.reshape(height, width, 4)
+        return np.ascontiguousarray(rgba[::-1]) if flip_v else rgba
+    rows = image_array(indices, width // pixels_per_element, height, np.uint16, False, flip_v)
+    return rgba_table[rows].reshape(height, width, 4)
+
+
+def render_plan(blast_type: Blast, plan: BlastPlan, table: np.ndarray, rgba_table: np.ndarray,
+                width: int, height: int, flip_v: bool = True) -> np.ndarray:
+    if plan.aligned and width % rgba_table.shape[1] == 0:
+        return render_indices(execute_plan_indices(plan), rgba_table, width, height, flip_v)
+    # Loop backs splitting elements, go through the decoded bytes
+    return blast_parse_rgba(blast_type, execute_plan(plan, table), width, height, False, flip_v)
@@ -0,0 +1,82 @@
+import threading
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from blastimation.image import BlastImage
+
+# Scaled frames kept ahead of playback
+PLAYBACK_BUDGET = 64 * 1024 * 1024
+
+
+# Nearest neighbour scaling into width x height, keeping the aspect ratio
+def scale_rgba(rgba: np.ndarray, width: int, height: int) -> np.ndarray:
+    src_height, src_width = rgba.shape[:2]
+    scale = min(width / src_width, height / src_height)
+    width = max(1, int(src_width * scale))
+    height = max(1, int(src_height * scale))
+    ys = np.arange(height) * src_height // height
+    xs = np.arange(width) * src_width // width
+    return rgba[ys[:, None], xs]
+
+
+# Decodes and scales the upcoming frames of an animation on a worker
+# thread into a bounded ring, so a playback tick only takes the next one.
+# A tick finding the ring empty counts as a dropped frame.
+class FrameRing:
+    def __init__(self, get_frame: Callable[[int], BlastImage], frame_count: int,
+                 width: int, height: int, start: int = 0, budget: int = PLAYBACK_BUDGET):
+        self.get_frame = get_frame
+        self.frame_count: int = frame_count
+        self.width: int = max(1, width)
+        self.height: int = max(1, height)
+        self.capacity: int = max(2, min(frame_count, budget // (self.width * self.height * 4)))
+
+        # (frame, image, scaled rgba)
+        self.frames: deque[tuple[int, BlastImage, np.ndarray]] = deque()
+        self.next_render: int = start % frame_count
+        self.condition = threading.Condition()
+        self.stopped: bool = False
+
+        self.rendered: int = 0
+        self.shown: int = 0
+        self.dropped: int = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and len(self.frames) >= self.capacity:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                frame = self.next_render
+                self.next_render = (frame + 1) % self.frame_count
+
+            image = self.get_frame(frame)
+            scaled = scale_rgba(image.rgba, self.width, self.height)
+
+            with self.condition:
+                if self.stopped:
+                    return
+                self.frames.append((frame, image, scaled))
+                self.rendered += 1
+
+    def next_frame(self) -> tuple[int, BlastImage, np.ndarray] | None:
+        with self.condition:
+            if not self.frames:
+                self.dropped += 1
+                return None
+            self.shown += 1
+            self.condition.notify()
+            return self.frames.popleft()
+
+    # Waits for the frame being rendered, the frames are not touched after
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
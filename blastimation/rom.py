@@ -1,97 +1,157 @@
-import struct
-import ryaml
+import hashlib
+import mmap
+import os
+from typing import Callable
 
-from blastimation.blast import Blast, blast_has_lut
+import numpy as np
+
+from blastimation.batch import DecodeJob, decode_jobs
+from blastimation.blast import Blast, blast_has_lut, blast_get_lut_size
+from blastimation.cache import decode_cache, get_cache_dir, thumbnail_cache
+from blastimation.catalogue import Catalogue
 from blastimation.image import BlastImage
-from blastimation.lut import luts, get_last_lut
+from blastimation.index import SEGMENT_BLAST, SEGMENT_LUT, load_assets
+from blastimation.lut import luts, add_lut
 
 ROM_OFFSET = 0x4CE0
 END_OFFSET = 0xCCE0
 
+# Offsets are relative to the start of the table
+HEADER_DTYPE = np.dtype([
+    ("start", ">u4"),
+    ("size", ">u2"),
+    ("type", ">u2"),
+])
+
+
+# Like get_last_lut while walking the table, for every entry the highest
+# LUT address of each LUT type seen so far.
+def accumulate_luts(blast_ids: np.ndarray, addresses: np.ndarray, is_lut: np.ndarray,
+                    sizes: np.ndarray) -> np.ndarray:
+    image_luts = np.zeros(len(addresses), dtype=np.int64)
+    for blast_type in Blast:
+        if blast_has_lut(blast_type):
+            lut_addresses = np.where(is_lut & (sizes == blast_get_lut_size(blast_type)), addresses, 0)
+            last_luts = np.maximum.accumulate(lut_addresses) if len(addresses) else lut_addresses
+            image_luts = np.where(blast_ids == blast_type.value, last_luts, image_luts)
+    return image_luts
+
 
 class Rom:
     def __init__(self):
+        self.catalogue: Catalogue = Catalogue()
+        # Views onto the catalogue rows
         self.images: dict[int:BlastImage] = {}
+        self.path: str = ""
+        self.hash: bytes = b""
+        # Images and LUTs are views into this mapping
+        self.mapping: mmap.mmap = None
+        self.data: memoryview = memoryview(b"")
 
     def load(self, path: str):
         if path.endswith(".yaml"):
             self.load_yaml(path)
         else:
             self.load_rom(path)
+        self.measure()
+        decode_cache.open(os.path.join(get_cache_dir(), "decode-%s.bin" % self.hash.hex()[:16]), self.hash)
+        thumbnail_cache.open(os.path.join(get_cache_dir(), "thumbnails-%s.bin" % self.hash.hex()[:16]), self.hash)
+
+    def map(self, rom_path: str) -> memoryview:
+        with open(rom_path, "rb") as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = os.path.abspath(rom_path)
+        self.data = memoryview(self.mapping)
+        self.hash = hashlib.sha1(self.data).digest()
+        return self.data
+
+    # Images are data[address:address + size] of the mapped ROM
+    def set_images(self, addresses, blast_ids, sizes, widths=None, heights=None, image_luts=None):
+        self.catalogue = Catalogue(self.data, addresses, blast_ids, addresses, sizes, widths, heights, image_luts)
+        self.images = {address: BlastImage.view(self.catalogue, row)
+                       for row, address in enumerate(self.catalogue.address.tolist())}
+
+    # Fill decoded sizes and missing resolutions without decoding
+    def measure(self):
+        for image in self.images.values():
+            image.measure()
+
+    def rows(self, addresses: list[int]) -> np.ndarray:
+        return self.catalogue.rows(addresses)
+
+    def select(self, addresses: list[int] = None, blast: Blast = None,
+               start: int = None, end: int = None) -> list[int]:
+        rows = None if addresses is None else self.rows(addresses)
+        return self.catalogue.address[self.catalogue.select(rows, blast, start, end)].tolist()
+
+    # Decodes the selected images in a process pool. Workers map the ROM
+    # themselves and only get the offsets.
+    def decode_batch(self, addresses: list[int] = None, blast: Blast = None,
+                     start: int = None, end: int = None, parse: bool = False,
+                     processes: int = None, progress: Callable[[int, int], None] = None) -> dict[int, bytes]:
+        results = {}
+        jobs: list[DecodeJob] = []
+        c = self.catalogue
+        rows = c.select(None if addresses is None else self.rows(addresses), blast, start, end)
+        for address, blast_id, size, lut, width, height in zip(c.address[rows].tolist(), c.blast[rows].tolist(),
+                                                                c.encoded_size[rows].tolist(), c.lut[rows].tolist(),
+                                                                c.width[rows].tolist(), c.height[rows].tolist()):
+            if parse:
+                cached = decode_cache.get(*self.images[address].cache_key())
+                if cached is not None:
+                    results[address] = cached
+                    continue
+            jobs.append((address, Blast(blast_id), size, lut, width, height))
+
+        decoded = decode_jobs(self.path, jobs, parse, processes, progress)
+        if parse:
+            for address, raw in decoded.items():
+                decode_cache.put(*self.images[address].cache_key(), raw)
+        results.update(decoded)
+        return results
 
     def load_yaml(self, yaml_path: str):
-        with open(yaml_path, "r") as f:
-            y = ryaml.load(f)
+        index = load_assets(yaml_path)
+        rom_bytes = self.map(index.target_path)
 
-        rom_path = y['options']['target_path']
-        with open(rom_path, "rb") as f:
-            rom_bytes = f.read()
-
-        segments = []
-        for segment in y["segments"]:
-            if len(segments) > 0:
-                if "end" not in segments[-1]:
-                    if isinstance(segment, list):
-                        segments[-1]["end"] = segment[0]
-                    elif isinstance(segment, dict):
-                        segments[-1]["end"] = segment["start"]
-
-            if isinstance(segment, dict) or len(segment) == 1:
-                continue
-
-            if segment[1] == "blast" and segment[3] != 0:
-                segment_dict = {
-                    "start": segment[0],
-                    "blast": Blast(segment[3]),
-                    "width": segment[4],
-                    "height": segment[5],
-                    "type": "blast"
-                }
-                segments.append(segment_dict)
-            elif segment[1] == "bin" and len(segment) == 3 and ".lut" in segment[2]:
-                segment_dict = {
-                    "start": segment[0],
-                    "type": "lut"
-                }
-                segments.append(segment_dict)
-
-        for s in segments:
-            address: int = s["start"]
-            data: bytes = rom_bytes[address:s["end"]]
-            if s["type"] == "lut":
-                size = (s["end"] - s["start"])
-                luts[size][address] = data
-            elif s["type"] == "blast":
-                self.images[address] = BlastImage(s["blast"], address, data, s["width"], s["height"])
-                if blast_has_lut(s["blast"]):
-                    self.images[address].lut = get_last_lut(s["blast"])
-
-    def load_rom(self, rom_path: str):
+        segments = index.segments
+        starts = segments["start"].astype(np.int64)
+        sizes = segments["end"].astype(np.int64) - starts
+        is_lut = segments["type"] == SEGMENT_LUT
+        is_image = segments["type"] == SEGMENT_BLAST
+
+        for start, size in zip(starts[is_lut].tolist(), sizes[is_lut].tolist()):
+            add_lut(start, rom_bytes[start:start + size])
+
+        image_luts = accumulate_luts(segments["blast"], starts, is_lut, sizes)
+        self.set_images(starts[is_image], segments["blast"][is_image], sizes[is_image],
+                        segments["width"][is_image], segments["height"][is_image], image_luts[is_image])
+
+    def load_rom(self, rom_path: str, table_start: int = ROM_OFFSET, table_end: int = END_OFFSET):
         print("Loading directly from ROM...")
         print("WARNING: Resolutions will be broken! You need to load the yaml.")
-        with open(rom_path, "rb") as f:
-            rom_bytes = f.read()
+        rom_bytes = self.map(rom_path)
 
-        for i in range(ROM_OFFSET, END_OFFSET, 8):
-            start = struct.unpack(">I", rom_bytes[i:i + 4])[0]
-            size = struct.unpack(">H", rom_bytes[i + 4:i + 6])[0]
-            blast_type = Blast(struct.unpack(">H", rom_bytes[i + 6:i + 8])[0])
-            assert len(rom_bytes) >= start
+        table = np.frombuffer(rom_bytes[table_start:table_end], dtype=HEADER_DTYPE)
+        starts = table["start"].astype(np.int64)
+        sizes = table["size"].astype(np.int64)
+        types = table["type"].astype(np.int64)
 
-            if size > 0:
-                address: int = start + ROM_OFFSET
-                encoded_bytes = rom_bytes[start + ROM_OFFSET: start + ROM_OFFSET + size]
+        assert np.all(starts <= len(rom_bytes)), "Header entry starts past the end of the ROM"
+        assert np.all(types <= max(b.value for b in Blast)), "Header entry with unknown blast type"
 
-                assert len(encoded_bytes) == size
+        used = sizes > 0
+        addresses = starts + table_start
+        assert np.all(addresses[used] + sizes[used] <= len(rom_bytes)), "Header entry ends past the end of the ROM"
 
-                if blast_type == Blast.BLAST0:
-                    if size in [128, 256]:
-                        luts[size][address] = encoded_bytes
-                    continue
+        is_lut = used & (types == Blast.BLAST0.value) & np.isin(sizes, list(luts.keys()))
+        is_image = used & (types != Blast.BLAST0.value)
+
+        for address, size in zip(addresses[is_lut].tolist(), sizes[is_lut].tolist()):
+            add_lut(address, rom_bytes[address:address + size])
 
-                self.images[address] = BlastImage(blast_type, address, encoded_bytes)
-                if blast_has_lut(blast_type):
-                    self.images[address].lut = get_last_lut(blast_type)
+        image_luts = accumulate_luts(types, addresses, is_lut, sizes)
+        self.set_images(addresses[is_image], types[is_image], sizes[is_image], image_luts=image_luts[is_image])
 
 
 rom = Rom()
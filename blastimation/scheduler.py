@@ -0,0 +1,94 @@
+import heapq
+import os
+import threading
+import traceback
+from typing import Callable, Hashable
+
+# Job priorities, lowest first
+PRIORITY_SELECTED = 0
+PRIORITY_VISIBLE = 1
+PRIORITY_REST = 2
+
+
+# Runs work(key) on a pool of worker threads, most urgent key first, and
+# hands the result to done(key, result) on the worker. A key runs at the
+# most urgent priority it was scheduled at. Cancelling a priority returns
+# its pending keys to the next one they were scheduled at, or drops them,
+# without touching the running ones.
+class DecodeScheduler:
+    def __init__(self, work: Callable[[Hashable], object], done: Callable[[Hashable, object], None],
+                 workers: int = None):
+        self.work = work
+        self.done = done
+        # key -> priorities the pending jobs were scheduled at, the heap
+        # may hold stale entries
+        self.pending: dict[Hashable, set[int]] = {}
+        self.heap: list[tuple[int, int, Hashable]] = []
+        self.running: set[Hashable] = set()
+        self.counter: int = 0
+        self.condition = threading.Condition()
+        self.stopped: bool = False
+
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(workers or os.cpu_count())]
+        for thread in self.threads:
+            thread.start()
+
+    def schedule(self, keys: list[Hashable], priority: int):
+        with self.condition:
+            for key in keys:
+                if key in self.running or priority in self.pending.get(key, ()):
+                    continue
+                self.pending.setdefault(key, set()).add(priority)
+                heapq.heappush(self.heap, (priority, self.counter, key))
+                self.counter += 1
+            self.condition.notify_all()
+
+    def cancel(self, priority: int):
+        with self.condition:
+            for key in [key for key, priorities in self.pending.items() if priority in priorities]:
+                self.pending[key].discard(priority)
+                if not self.pending[key]:
+                    del self.pending[key]
+            if not self.pending:
+                self.heap = []
+
+    def take(self) -> Hashable:
+        with self.condition:
+            while True:
+                if self.stopped:
+                    return None
+                while self.heap:
+                    priority, _, key = heapq.heappop(self.heap)
+                    if key in self.pending and min(self.pending[key]) == priority:
+                        del self.pending[key]
+                        self.running.add(key)
+                        return key
+                self.condition.wait()
+
+    def run(self):
+        while True:
+            key = self.take()
+            if key is None:
+                return
+            try:
+                result = self.work(key)
+            except Exception:
+                traceback.print_exc()
+                continue
+            finally:
+                # Before done, which may schedule the key again
+                with self.condition:
+                    self.running.discard(key)
+            try:
+                self.done(key, result)
+            except Exception:
+                traceback.print_exc()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.pending = {}
+            self.heap = []
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
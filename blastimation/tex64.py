@@ -2,6 +2,8 @@
 
 from math import ceil
 
+import numpy as np
+
 
 # RRRRRGGG GGBBBBBA
 def unpack_color(data):
@@ -68,3 +70,84 @@ def parse_ia8(data, width, height, flip_h=False, flip_v=False):
         img += bytes((i, a))
 
     return img
+
+
+# Array based versions of the parsers above, converting through lookup
+# tables with identical output.
+
+def _build_rgba16_table() -> np.ndarray:
+    s = np.arange(0x10000, dtype=np.uint32)
+    scale5 = np.array([ceil(0xFF * (v / 31)) for v in range(32)], dtype=np.uint8)
+    table = np.empty((0x10000, 4), dtype=np.uint8)
+    table[:, 0] = scale5[(s >> 11) & 0x1F]
+    table[:, 1] = scale5[(s >> 6) & 0x1F]
+    table[:, 2] = scale5[(s >> 1) & 0x1F]
+    table[:, 3] = (s & 1) * 0xFF
+    return table
+
+
+def _build_ia8_table() -> np.ndarray:
+    b = np.arange(0x100, dtype=np.uint32)
+    scale4 = np.array([ceil(0xFF * (v / 15)) for v in range(16)], dtype=np.uint8)
+    table = np.empty((0x100, 2), dtype=np.uint8)
+    table[:, 0] = scale4[(b >> 4) & 0xF]
+    table[:, 1] = scale4[b & 0xF]
+    return table
+
+
+def _build_ia8_rgba_table() -> np.ndarray:
+    return IA8_TABLE[:, [0, 0, 0, 1]]
+
+
+# RRRRRGGG GGBBBBBA -> RGBA8888
+RGBA16_TABLE = _build_rgba16_table()
+# IIIIAAAA -> IA88
+IA8_TABLE = _build_ia8_table()
+# IIIIAAAA -> RGBA8888
+IA8_RGBA_TABLE = _build_ia8_rgba_table()
+
+
+# A (height, width) view of the pixels, flips are reversed strides and
+# only get resolved by whatever consumes the view.
+def image_array(data, width, height, dtype, flip_h=False, flip_v=False) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    pixels = np.frombuffer(data, dtype=np.uint8)
+    size = width * height * dtype.itemsize
+    if len(pixels) < size:
+        # Missing pixels read as 0
+        pixels = np.concatenate((pixels, np.zeros(size - len(pixels), dtype=np.uint8)))
+    pixels = pixels[:size].view(dtype).reshape(height, width)
+
+    if flip_v:
+        pixels = pixels[::-1]
+    if flip_h:
+        pixels = pixels[:, ::-1]
+    return pixels
+
+
+# The table gathers write the flipped pixels straight into their
+# contiguous output, no extra pass is needed for flipping.
+def parse_rgba16_table(data, width, height, flip_h=False, flip_v=False) -> np.ndarray:
+    return RGBA16_TABLE[image_array(data, width, height, ">u2", flip_h, flip_v)]
+
+
+# Copies whole rows when only flipping vertically
+def parse_rgba32_array(data, width, height, flip_h=False, flip_v=False) -> np.ndarray:
+    if not flip_h:
+        return np.ascontiguousarray(image_array(data, 1, height, (np.void, width * 4), False, flip_v))
+    return np.ascontiguousarray(image_array(data, width, height, "V4", flip_h, flip_v))
+
+
+# Parsers to RGBA8888 (height, width, 4) arrays, for display
+
+def parse_ia8_rgba(data, width, height, flip_h=False, flip_v=False) -> np.ndarray:
+    return IA8_RGBA_TABLE[image_array(data, width, height, np.uint8, flip_h, flip_v)]
+
+
+def parse_ia16_rgba(data, width, height, flip_h=False, flip_v=False) -> np.ndarray:
+    ia = np.ascontiguousarray(image_array(data, width, height, "V2", flip_h, flip_v))
+    return np.ascontiguousarray(ia.view(np.uint8).reshape(height, width, 2)[:, :, [0, 0, 0, 1]])
+
+
+def parse_rgba32_rgba(data, width, height, flip_h=False, flip_v=False) -> np.ndarray:
+    return parse_rgba32_array(data, width, height, flip_h, flip_v).view(np.uint8).reshape(height, width, 4)
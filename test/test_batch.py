@@ -0,0 +1,45 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from blastimation.batch import decode_job
+from blastimation.blast import Blast, decode_blast, decode_blast_lookup
+from blastimation.rom import Rom
+from test.test_blast import random_encoded
+
+
+class TestBatch(unittest.TestCase):
+    def test_decode_batch(self):
+        rom_bytes = bytearray(0x1000 + 64 * 0x800)
+        for i in range(64):
+            encoded = random_encoded(i, 256)
+            rom_bytes[0x1000 + i * 0x800:0x1000 + i * 0x800 + len(encoded)] = encoded
+
+        with tempfile.TemporaryDirectory() as directory:
+            rom_path = os.path.join(directory, "rom.z64")
+            with open(rom_path, "wb") as f:
+                f.write(rom_bytes)
+
+            rom = Rom()
+            rom.map(rom_path)
+            addresses = [0x1000 + i * 0x800 for i in range(64)]
+            blast_ids = [Blast.BLAST1_RGBA16.value if i % 2 else Blast.BLAST2_RGBA32.value for i in range(64)]
+            rom.set_images(addresses, blast_ids, [512] * 64)
+
+            decoded = rom.decode_batch(blast=Blast.BLAST2_RGBA32, end=0x5000, processes=2)
+
+            self.assertEqual(sorted(decoded.keys()), list(range(0x1000, 0x5001, 0x1000)))
+            for address, data in decoded.items():
+                self.assertEqual(data, decode_blast(Blast.BLAST2_RGBA32, rom.images[address].encoded,
+                                                    use_tables=False))
+
+    def test_decode_job_invalid_lut_word(self):
+        # A BLAST4 LUT at 0x100 with the top bit set in its second half
+        lut = struct.pack(">32H", *range(32)) + struct.pack(">32H", *range(0x8000, 0x8020))
+        rom_data = memoryview(bytes(0x100) + lut + struct.pack(">2H", 0x0102, 0x4002))
+        valid = (0x180, Blast.BLAST4_IA16, 2, 0x100, 0, 0)
+        self.assertEqual(decode_job(rom_data, valid),
+                         decode_blast_lookup(Blast.BLAST4_IA16, rom_data[0x180:0x182], lut, use_tables=False))
+        with self.assertRaises(ValueError):
+            decode_job(rom_data, (0x182, Blast.BLAST4_IA16, 2, 0x100, 0, 0))
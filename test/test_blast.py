@@ -0,0 +1,107 @@
+import random
+import struct
+import unittest
+
+from blastimation.blast import Blast, decode_blast, decode_blast_lookup, blast_get_literal_invalid_bits, \
+    blast_get_lut_size, blast_literal_table, blast_lookup_table, blast_decoded_size, make_plan, execute_plan, \
+    execute_plan_indices, apply_table
+
+
+def random_encoded(seed: int, words: int = 4096, invalid_bits: int = 0) -> bytes:
+    rng = random.Random(seed)
+    encoded = []
+    for i in range(words):
+        if i > 0 and rng.random() < 0.3:
+            encoded.append(0x8000 | rng.randrange(0x8000))
+        else:
+            encoded.append(rng.randrange(0x8000) & ~invalid_bits)
+    return struct.pack(">%dH" % len(encoded), *encoded)
+
+
+class TestBlast(unittest.TestCase):
+    def test_decode_tables(self):
+        for blast_type in [Blast.BLAST1_RGBA16, Blast.BLAST2_RGBA32, Blast.BLAST3_IA8, Blast.BLAST6_IA8]:
+            invalid_bits = blast_get_literal_invalid_bits(blast_type)
+            for seed in range(8):
+                encoded = random_encoded(seed, invalid_bits=invalid_bits)
+                self.assertEqual(decode_blast(blast_type, encoded, use_tables=False),
+                                 decode_blast(blast_type, encoded), blast_type.name)
+
+    def test_decode_tables_all_literals(self):
+        for blast_type in [Blast.BLAST1_RGBA16, Blast.BLAST2_RGBA32, Blast.BLAST3_IA8, Blast.BLAST6_IA8]:
+            invalid_bits = blast_get_literal_invalid_bits(blast_type)
+            literals = [w for w in range(0x8000) if not w & invalid_bits]
+            encoded = struct.pack(">%dH" % len(literals), *literals)
+            self.assertEqual(decode_blast(blast_type, encoded, use_tables=False),
+                             decode_blast(blast_type, encoded), blast_type.name)
+
+    def test_decode_tables_invalid_literal(self):
+        with self.assertRaises(ValueError):
+            decode_blast(Blast.BLAST3_IA8, struct.pack(">H", 0x0080))
+
+    def test_decode_lookup_tables(self):
+        for blast_type, lut_size in [(Blast.BLAST4_IA16, 128), (Blast.BLAST5_RGBA32, 256)]:
+            invalid_bits = blast_get_literal_invalid_bits(blast_type)
+            rng = random.Random(lut_size)
+            lut = struct.pack(">%dH" % (lut_size // 2), *[rng.randrange(0x8000) for _ in range(lut_size // 2)])
+            for seed in range(8):
+                encoded = random_encoded(seed, invalid_bits=invalid_bits)
+                self.assertEqual(decode_blast_lookup(blast_type, encoded, lut, use_tables=False),
+                                 decode_blast_lookup(blast_type, encoded, lut), blast_type.name)
+
+    def test_decode_lookup_tables_invalid_lut_word(self):
+        # LUT words with the top bit set overflow the BLAST4 transform
+        lut = struct.pack(">32H", *range(32)) + struct.pack(">32H", *range(0x8000, 0x8020))
+        valid = struct.pack(">2H", 0x0102, 0x3F3E)
+        self.assertEqual(decode_blast_lookup(Blast.BLAST4_IA16, valid, lut, use_tables=False),
+                         decode_blast_lookup(Blast.BLAST4_IA16, valid, lut))
+        for word in [0x4002, 0x0240]:
+            encoded = struct.pack(">H", word)
+            with self.assertRaises(struct.error):
+                decode_blast_lookup(Blast.BLAST4_IA16, encoded, lut, use_tables=False)
+            with self.assertRaises(ValueError):
+                decode_blast_lookup(Blast.BLAST4_IA16, encoded, lut)
+
+    def test_plan_copies(self):
+        # Loop backs longer than their offset only copy what is already decoded
+        encoded = struct.pack(">4H", 0x0001, 0x0002, 0x8000 | (4 << 5) | 31, 0x8000 | (20 << 5) | 3)
+        plan = make_plan(Blast.BLAST1_RGBA16, encoded)
+        self.assertEqual(plan.size, len(decode_blast(Blast.BLAST1_RGBA16, encoded, use_tables=False)))
+        self.assertEqual(execute_plan(plan, blast_literal_table(Blast.BLAST1_RGBA16)),
+                         decode_blast(Blast.BLAST1_RGBA16, encoded, use_tables=False))
+
+    def test_decoded_size(self):
+        for blast_type in [Blast.BLAST1_RGBA16, Blast.BLAST2_RGBA32, Blast.BLAST3_IA8, Blast.BLAST6_IA8]:
+            invalid_bits = blast_get_literal_invalid_bits(blast_type)
+            for seed in range(8):
+                encoded = random_encoded(seed, invalid_bits=invalid_bits)
+                self.assertEqual(len(decode_blast(blast_type, encoded, use_tables=False)),
+                                 blast_decoded_size(blast_type, encoded), blast_type.name)
+
+    def test_decoded_size_fast_path(self):
+        # 16 literals followed by loop backs that stay inside the decoded bytes
+        words = list(range(16)) + [0x8000 | (8 << 5) | 4, 0x8000 | (16 << 5) | 8, 0x1234]
+        encoded = struct.pack(">%dH" % len(words), *words)
+        self.assertEqual(len(decode_blast(Blast.BLAST1_RGBA16, encoded, use_tables=False)),
+                         blast_decoded_size(Blast.BLAST1_RGBA16, encoded))
+        self.assertEqual(blast_decoded_size(Blast.BLAST1_RGBA16, b""), 0)
+
+    def test_plan_indices(self):
+        rng = random.Random(5)
+        # Even offset fields keep BLAST4/5 loop backs on whole elements
+        words = [rng.randrange(0x800) & ~0x80 for _ in range(64)]
+        for i in range(2048):
+            if rng.random() < 0.3:
+                words.append(0x8000 | ((rng.randrange(0x400) & ~1) << 5) | rng.randrange(32))
+            else:
+                words.append(rng.randrange(0x800) & ~0x80)
+        encoded = struct.pack(">%dH" % len(words), *words)
+        lut = struct.pack(">128H", *[rng.randrange(0x8000) for _ in range(128)])
+
+        for blast_type in [Blast.BLAST4_IA16, Blast.BLAST5_RGBA32]:
+            plan = make_plan(blast_type, encoded)
+            self.assertTrue(plan.aligned)
+            indices = execute_plan_indices(plan)
+            self.assertEqual(apply_table(indices, blast_lookup_table(blast_type, lut[:blast_get_lut_size(blast_type)])),
+                             decode_blast_lookup(blast_type, encoded, lut[:blast_get_lut_size(blast_type)],
+                                                 use_tables=False))
@@ -0,0 +1,215 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from blastimation.blast import Blast, blast_get_literal_invalid_bits
+from blastimation.cache import DecodeCache, MemoryCache, PAGE_SLOTS, PENDING_THUMBNAILS, ThumbnailCache, \
+    memory_cache
+from blastimation.image import BlastImage
+from blastimation.lut import get_lut_rgba_table, lut_tables, luts
+from test.test_blast import random_encoded
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "decode.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip(self):
+        cache = DecodeCache()
+        cache.open(self.path, b"a" * 20)
+        cache.put((0x1000, 1, 32, 32, 0), 1, b"\x01" * 17)
+        cache.put((0x2000, 5, 32, 32, 0xCCE0), 2, b"\x02" * 64)
+        cache.save()
+
+        cache = DecodeCache()
+        cache.open(self.path, b"a" * 20)
+        self.assertEqual(bytes(cache.get((0x1000, 1, 32, 32, 0), 1)), b"\x01" * 17)
+        self.assertEqual(bytes(cache.get((0x2000, 5, 32, 32, 0xCCE0), 2)), b"\x02" * 64)
+        self.assertIsNone(cache.get((0x2000, 5, 32, 32, 0xCD00), 2))
+
+        # Appending keeps the existing entries
+        cache.put((0x3000, 2, 8, 8, 0), 3, b"\x03" * 256)
+        cache.save()
+        cache.open(self.path, b"a" * 20)
+        self.assertEqual(len(cache.entries), 3)
+        self.assertEqual(bytes(cache.get((0x3000, 2, 8, 8, 0), 3)), b"\x03" * 256)
+
+    def test_invalidation(self):
+        cache = DecodeCache()
+        cache.open(self.path, b"a" * 20)
+        cache.put((0x1000, 1, 32, 32, 0), 1, b"\x01" * 16)
+        cache.save()
+
+        # Another check value drops the entry
+        self.assertIsNone(cache.get((0x1000, 1, 32, 32, 0), 2))
+        cache.save()
+        cache.open(self.path, b"a" * 20)
+        self.assertEqual(cache.entries, {})
+
+        # Another ROM discards the whole file
+        cache.put((0x1000, 1, 32, 32, 0), 1, b"\x01" * 16)
+        cache.save()
+        cache.open(self.path, b"b" * 20)
+        self.assertIsNone(cache.get((0x1000, 1, 32, 32, 0), 1))
+
+    def test_compaction(self):
+        cache = DecodeCache()
+        cache.open(self.path, b"a" * 20)
+        cache.put((0x1000, 1, 32, 32, 0), 1, b"\x01" * 4096)
+        cache.put((0x2000, 1, 32, 32, 0), 1, b"\x02" * 64)
+        cache.save()
+        size = os.path.getsize(self.path)
+
+        # Replaced data stays in the file until most of it is dead
+        cache.put((0x1000, 1, 32, 32, 0), 2, b"\x03" * 16)
+        cache.save()
+        self.assertGreater(os.path.getsize(self.path), size)
+        cache.open(self.path, b"a" * 20)
+        self.assertLess(os.path.getsize(self.path), size)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        self.assertEqual(bytes(cache.get((0x1000, 1, 32, 32, 0), 2)), b"\x03" * 16)
+        self.assertEqual(bytes(cache.get((0x2000, 1, 32, 32, 0), 1)), b"\x02" * 64)
+
+    def test_pending_flush(self):
+        cache = DecodeCache()
+        cache.open(self.path, b"a" * 20)
+        with mock.patch("blastimation.cache.PENDING_SIZE", 100):
+            cache.put((0x1000, 1, 32, 32, 0), 1, b"\x01" * 64)
+            self.assertFalse(os.path.exists(self.path))
+            cache.put((0x2000, 1, 32, 32, 0), 1, b"\x02" * 64)
+        self.assertFalse(cache.pending)
+        self.assertEqual(len(cache.entries), 2)
+
+    def test_thumbnails(self):
+        path = os.path.join(self.directory.name, "cache", "thumbnails.bin")
+        cache = ThumbnailCache()
+        cache.open(path, b"a" * 20)
+        wide = np.full((64, 128, 4), 1, dtype=np.uint8)
+        cache.put((0, 0x1000, 0), 1, wide)
+        # More than a page
+        for i in range(PAGE_SLOTS):
+            cache.put((1, 0x2000 + i, 0xCCE0), 2, np.full((128, 32, 4), i, dtype=np.uint8))
+        cache.save()
+
+        cache = ThumbnailCache()
+        cache.open(path, b"a" * 20)
+        self.assertEqual(len(cache.pages), 2)
+        np.testing.assert_array_equal(cache.get((0, 0x1000, 0), 1), wide)
+        self.assertEqual(cache.get((1, 0x2000 + 7, 0xCCE0), 2)[0, 0, 0], 7)
+        self.assertTrue(cache.has((0, 0x1000, 0), 1))
+        # Changed metadata or another LUT
+        self.assertIsNone(cache.get((0, 0x1000, 0), 3))
+        self.assertIsNone(cache.get((0, 0x1000, 0xCCE0), 1))
+
+        # A changed thumbnail takes a free slot, the index on disk keeps the
+        # old one until the header points at the new index
+        slot = cache.entries[(0, 0x1000, 0)][1]
+        cache.put((0, 0x1000, 0), 3, np.full((16, 16, 4), 9, dtype=np.uint8))
+        with mock.patch("os.fsync", side_effect=OSError):
+            self.assertRaises(OSError, cache.save)
+        crashed = ThumbnailCache()
+        crashed.open(path, b"a" * 20)
+        np.testing.assert_array_equal(crashed.get((0, 0x1000, 0), 1), wide)
+        self.assertTrue(cache.has((0, 0x1000, 0), 3))
+
+        cache.save()
+        cache.open(path, b"a" * 20)
+        self.assertNotEqual(cache.entries[(0, 0x1000, 0)][1], slot)
+        self.assertEqual(cache.entries[(0, 0x1000, 0)][2:], (16, 16))
+        self.assertEqual(cache.get((0, 0x1000, 0), 3).shape, (16, 16, 4))
+        self.assertEqual(len(cache.entries), PAGE_SLOTS + 1)
+        # The slot it left is used again
+        cache.put((2, 0x3000, 0), 1, np.full((8, 8, 4), 5, dtype=np.uint8))
+        cache.save()
+        self.assertEqual(cache.entries[(2, 0x3000, 0)][1], slot)
+        self.assertEqual(len(cache.pages), 2)
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+        # Written out once enough are pending
+        for i in range(PENDING_THUMBNAILS):
+            cache.put((1, 0x4000 + i, 0), 4, np.full((8, 8, 4), 1, dtype=np.uint8))
+        self.assertFalse(cache.pending)
+        self.assertEqual(len(cache.entries), PAGE_SLOTS + 2 + PENDING_THUMBNAILS)
+
+        # Compacting drops the old indexes and free slots
+        size = os.path.getsize(path)
+        cache.compact()
+        self.assertLess(os.path.getsize(path), size)
+        self.assertEqual(len(cache.entries), PAGE_SLOTS + 2 + PENDING_THUMBNAILS)
+        np.testing.assert_array_equal(cache.get((0, 0x1000, 0), 3), np.full((16, 16, 4), 9, dtype=np.uint8))
+
+        cache.open(path, b"b" * 20)
+        self.assertFalse(cache.entries)
+
+    def test_memory_eviction(self):
+        cache = MemoryCache(100)
+        cache.put("a", 1, 40)
+        cache.put("b", 2, 40)
+        cache.get("a")
+        cache.put("c", 3, 40)
+        # b was used least recently
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.size, 80)
+
+        cache.pin("a")
+        cache.put("d", 4, 40)
+        cache.put("e", 5, 40)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("c"))
+        self.assertIsNone(cache.get("d"))
+
+        # Stays over budget while pinned, until unpinned
+        cache.put("f", 6, 80)
+        self.assertEqual(cache.size, 120)
+        cache.unpin("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("f"), 6)
+        # Unpinning again does nothing
+        cache.unpin("a")
+        self.assertEqual(cache.pinned, {})
+
+    def test_image_redecode(self):
+        image = BlastImage(Blast.BLAST1_RGBA16, 0x1000, random_encoded(1, 1024), 32, 16)
+        rgba = np.array(image.rgba)
+        memory_cache.discard(image.memory_key("rgba"))
+        self.assertIsNone(memory_cache.get(image.memory_key("rgba")))
+        self.assertTrue(np.array_equal(image.rgba, rgba))
+
+    def test_lut_change_during_decode(self):
+        luts[256][0x1000] = bytes(range(256))
+        luts[256][0x2000] = bytes(reversed(range(256)))
+        self.addCleanup(lambda: [(luts[256].pop(a, None), lut_tables.pop(a, None)) for a in (0x1000, 0x2000)])
+        encoded = random_encoded(2, 1024, blast_get_literal_invalid_bits(Blast.BLAST5_RGBA32))
+        image = BlastImage(Blast.BLAST5_RGBA32, 0x3000, encoded)
+        image.lut = 0x1000
+        image.measure()
+        expected = np.array(image.render(0x1000))
+        memory_cache.clear()
+
+        # The GUI picks another LUT while the worker renders
+        def switch(blast, lut):
+            image.lut = 0x2000
+            return get_lut_rgba_table(blast, lut)
+
+        with mock.patch("blastimation.image.get_lut_rgba_table", switch):
+            rgba = image.decode()
+        self.assertTrue(np.array_equal(rgba, expected))
+        self.assertIs(memory_cache.get(image.memory_key("rgba", 0x1000)), rgba)
+        self.assertIsNone(memory_cache.get(image.memory_key("rgba", 0x2000)))
+
+    def test_plan_keys(self):
+        # Same address, other bytes or another type, as when another ROM is loaded
+        images = [BlastImage(Blast.BLAST1_RGBA16, 0x5000, random_encoded(3, 1024), 32, 16),
+                  BlastImage(Blast.BLAST1_RGBA16, 0x5000, random_encoded(4, 1024), 32, 16),
+                  BlastImage(Blast.BLAST2_RGBA32, 0x5000, random_encoded(4, 1024), 32, 16)]
+        plans = [image.get_plan() for image in images]
+        self.assertEqual(len({id(plan) for plan in plans}), 3)
+        self.assertIs(images[0].get_plan(), plans[0])
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from blastimation.blast import Blast
+from blastimation.catalogue import Catalogue
+from blastimation.image import BlastImage
+from blastimation.rom import HEADER_DTYPE, Rom
+
+
+class TestCatalogue(unittest.TestCase):
+    def test_columns(self):
+        data = memoryview(bytes(range(256)))
+        catalogue = Catalogue(data, [0x30, 0x10, 0x20, 0x10], [1, 2, 5, 3], [0x30, 0x10, 0x20, 0x10], [8, 4, 4, 2])
+
+        # Sorted by address, the last entry of an address wins
+        self.assertEqual(catalogue.address.tolist(), [0x10, 0x20, 0x30])
+        self.assertEqual(catalogue.blast.tolist(), [3, 5, 1])
+        self.assertEqual(bytes(catalogue.encoded(2)), bytes(range(0x30, 0x38)))
+
+        self.assertEqual(catalogue.rows([0x30, 0x10]).tolist(), [2, 0])
+        with self.assertRaises(AssertionError):
+            catalogue.rows([0x18])
+
+        self.assertEqual(catalogue.select(blast=Blast.BLAST5_RGBA32).tolist(), [1])
+        self.assertEqual(catalogue.select(start=0x18).tolist(), [1, 2])
+        self.assertEqual(catalogue.select(np.array([2, 0]), end=0x20).tolist(), [0])
+
+    def test_view(self):
+        catalogue = Catalogue(memoryview(bytes(64)), [0x10, 0x20], [1, 4], [0, 32], [32, 32])
+        image = BlastImage.view(catalogue, 1)
+        self.assertEqual(image.blast, Blast.BLAST4_IA16)
+        self.assertEqual(image.encoded_size, 32)
+
+        image.lut = 0x1234
+        image.width = 16
+        self.assertEqual(catalogue.lut.tolist(), [0, 0x1234])
+        self.assertEqual(catalogue.width.tolist(), [0, 16])
+        self.assertFalse(hasattr(image, "__dict__"))
+
+    def test_load_rom_table_start(self):
+        # A table at 0x40 with offsets relative to it
+        table = np.array([(0x20, 8, Blast.BLAST1_RGBA16.value), (0x30, 0, 0)], dtype=HEADER_DTYPE)
+        data = bytearray(0x80)
+        data[0x40:0x40 + table.nbytes] = table.tobytes()
+        data[0x60:0x68] = bytes(range(1, 9))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rom.z64")
+            with open(path, "wb") as f:
+                f.write(data)
+            rom = Rom()
+            rom.load_rom(path, 0x40, 0x40 + table.nbytes)
+            self.assertEqual(list(rom.images), [0x60])
+            self.assertEqual(bytes(rom.images[0x60].encoded), bytes(range(1, 9)))
+            # Unmapped so the directory can be removed
+            rom.images = {}
+            rom.catalogue = Catalogue()
+            rom.data.release()
+            rom.mapping.close()
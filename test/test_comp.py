@@ -0,0 +1,86 @@
+import subprocess
+import sys
+import unittest
+
+import numpy as np
+
+from blastimation.animation_comp import AnimationComp
+from blastimation.blast import Blast
+from blastimation.comp import Composite, CompType
+from blastimation.rom import rom
+
+
+# 4x2 images without encoded data, filled with their index + 1
+def set_solid_images(addresses: list[int]):
+    count = len(addresses)
+    rom.set_images(addresses, [Blast.BLAST2_RGBA32.value] * count, [0] * count, [4] * count, [2] * count)
+    for i, address in enumerate(addresses):
+        rom.images[address].set_rgba(np.full((2, 4, 4), i + 1, dtype=np.uint8))
+
+
+def make_comp(comp_type: CompType, addresses: list[int]) -> Composite:
+    c = Composite()
+    c.type = comp_type
+    c.addresses = addresses
+    c.update()
+    return c
+
+
+class TestComp(unittest.TestCase):
+    def tearDown(self):
+        rom.set_images([], [], [])
+
+    def test_headless_import(self):
+        # Blocks PySide6 imports
+        code = "import sys; sys.modules['PySide6'] = None; " \
+               "import blastimation.comp, blastimation.meta, blastimation.rom, blastimation.image"
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_comp_image(self):
+        layouts = {
+            CompType.TopBottom: [(1, 0, 0), (0, 0, 2)],
+            CompType.RightLeft: [(1, 0, 0), (0, 4, 0)],
+            CompType.Quad: [(2, 0, 0), (3, 4, 0), (0, 0, 2), (1, 4, 2)],
+        }
+        for comp_type, tiles in layouts.items():
+            addresses = [0x100 * (i + 1) for i in range(len(tiles))]
+            set_solid_images(addresses)
+            c = make_comp(comp_type, addresses)
+
+            image = c.get_image()
+            self.assertEqual(image.rgba.shape, (image.height, image.width, 4))
+            for i, x, y in tiles:
+                self.assertTrue(np.all(image.rgba[y:y + 2, x:x + 4] == i + 1), comp_type.name)
+
+    def test_comp_image_cache(self):
+        set_solid_images([0x100, 0x200])
+        c = make_comp(CompType.TopBottom, [0x100, 0x200])
+
+        image = c.get_image()
+        buffer = image.rgba
+        self.assertIs(c.get_image(), image)
+
+        # Decoding a tile again rebuilds the composite in the same buffer
+        rom.images[0x200].set_rgba(np.full((2, 4, 4), 7, dtype=np.uint8))
+        self.assertIs(c.get_image(), image)
+        self.assertTrue(np.shares_memory(image.rgba, buffer))
+        self.assertTrue(np.all(image.rgba[:2] == 7))
+        self.assertTrue(np.all(image.rgba[2:] == 1))
+
+    def test_aggregates(self):
+        addresses = [0x100 * (i + 1) for i in range(8)]
+        set_solid_images(addresses)
+        rom.catalogue.encoded_size[:] = np.arange(8)
+        rom.catalogue.decoded_size[:] = 10
+        rom.catalogue.lut[:] = 0x40
+
+        animation_comp = AnimationComp()
+        animation_comp.comps = [make_comp(CompType.Quad, addresses[:4]), make_comp(CompType.Quad, addresses[4:])]
+        animation_comp.update()
+
+        self.assertEqual(animation_comp.comps[1].encoded_size, 4 + 5 + 6 + 7)
+        self.assertEqual(animation_comp.encoded_size, sum(range(8)))
+        self.assertEqual(animation_comp.decoded_size, 80)
+        self.assertEqual((animation_comp.width, animation_comp.height), (8, 4))
+        self.assertEqual(animation_comp.lut, 0x40)
+        self.assertEqual(animation_comp.model_data()[2:8], ["BLAST2_RGBA32", "rgba32", 8, 4, 28, 80])
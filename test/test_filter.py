@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from blastimation.animation_comp import AnimationComp
+from blastimation.blast import Blast
+from blastimation.catalogue import Catalogue
+from blastimation.comp import CompType
+from blastimation.filter import FilterIndex, comp_columns, image_columns
+from blastimation.rom import rom
+from test.test_comp import make_comp, set_solid_images
+
+
+class TestFilter(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue(memoryview(b""), [0x400, 0x100, 0x300, 0x200, 0x500],
+                                   [Blast.BLAST5_RGBA32.value, Blast.BLAST1_RGBA16.value, Blast.BLAST5_RGBA32.value,
+                                    Blast.BLAST4_IA16.value, Blast.BLAST2_RGBA32.value],
+                                   [0] * 5, [64, 128, 32, 256, 16],
+                                   [32, 16, 64, 32, 8], [32, 16, 32, 64, 8])
+        self.index = FilterIndex(image_columns(self.catalogue, np.arange(len(self.catalogue))))
+
+    def addresses(self, criteria: dict) -> list[int]:
+        return self.catalogue.address[self.index.select(criteria)].tolist()
+
+    def test_criteria(self):
+        self.assertEqual(self.addresses({}), [0x100, 0x200, 0x300, 0x400, 0x500])
+        self.assertEqual(self.addresses({"blast": Blast.BLAST5_RGBA32.value}), [0x300, 0x400])
+        self.assertEqual(self.addresses({"format": "rgba32"}), [0x300, 0x400, 0x500])
+        self.assertEqual(self.addresses({"blast": [Blast.BLAST1_RGBA16.value, Blast.BLAST4_IA16.value]}),
+                         [0x100, 0x200])
+        # Inclusive ranges, open on None
+        self.assertEqual(self.addresses({"width": (16, 32)}), [0x100, 0x200, 0x400])
+        self.assertEqual(self.addresses({"encoded_size": (100, None)}), [0x100, 0x200])
+        self.assertEqual(self.addresses({"address": (None, 0x250), "blast": None}), [0x100, 0x200])
+        self.assertEqual(self.addresses({"width": 1000}), [])
+
+    def test_combined(self):
+        criteria = {"format": "rgba32", "width": (None, 32), "height": (32, 32)}
+        self.assertEqual(self.addresses(criteria), [0x400])
+        self.assertEqual(self.addresses(criteria | {"blast": [Blast.BLAST2_RGBA32.value, 9]}), [])
+        self.assertEqual(self.addresses({"blast": Blast.BLAST5_RGBA32.value, "address": (0x350, None)}), [0x400])
+
+    def test_comp_columns(self):
+        addresses = [0x100 * (i + 1) for i in range(12)]
+        set_solid_images(addresses)
+        self.addCleanup(rom.set_images, [], [], [])
+        animation_comp = AnimationComp()
+        animation_comp.comps = [make_comp(CompType.Quad, addresses[4:8]), make_comp(CompType.Quad, addresses[8:])]
+        animation_comp.update()
+        comps = [make_comp(CompType.Quad, addresses[:4]), make_comp(CompType.Animation, addresses[1:4]),
+                 animation_comp]
+
+        columns = comp_columns(comps)
+        self.assertEqual(columns["address"].tolist(), [0x100, 0x200, 0x500])
+        self.assertEqual(columns["format"].tolist(), ["rgba32"] * 3)
+        self.assertEqual(columns["width"].tolist(), [8, 4, 8])
+        self.assertEqual(columns["frames"].tolist(), [1, 3, 2])
+
+        index = FilterIndex(columns)
+        animations = [CompType.Animation.value, CompType.AnimationComp.value]
+        self.assertEqual(index.select({"comp": animations}).tolist(), [1, 2])
+        self.assertEqual(index.select({"comp": animations, "frames": (None, 2)}).tolist(), [2])
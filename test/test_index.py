@@ -0,0 +1,70 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from blastimation.index import INDEX_VERSION, SEGMENT_BLAST, SEGMENT_LUT, compile_assets, load_assets
+
+ASSETS_YAML = """options:
+  target_path: rom.z64
+segments:
+  - name: header
+    type: header
+    start: 0x0
+  - [0x004CE0, bin]
+  - [0x00CCE0, bin, 00CCE0.lut256]
+  - [0x00CDE0, blast, 00CDE0.blast5, 5, 32, 32]
+  - [0x00D37E]
+  - [0x00D380, blast, 00D380.blast1, 1, 16, 16]
+  - [0x00D4EA]
+"""
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.yaml_path = os.path.join(self.directory.name, "assets.yaml")
+        with open(self.yaml_path, "w") as f:
+            f.write(ASSETS_YAML)
+        self.environ = mock.patch.dict(os.environ, {"BLASTIMATION_CACHE": os.path.join(self.directory.name, "cache")})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def test_load_assets(self):
+        index = load_assets(self.yaml_path)
+        self.assertEqual(index.target_path, "rom.z64")
+        self.assertEqual(index.segments.tolist(), [
+            (0x00CCE0, 0x00CDE0, SEGMENT_LUT, 0, 0, 0),
+            (0x00CDE0, 0x00D37E, SEGMENT_BLAST, 5, 32, 32),
+            (0x00D380, 0x00D4EA, SEGMENT_BLAST, 1, 16, 16),
+        ])
+
+    def test_rebuild_on_change(self):
+        self.assertEqual(len(load_assets(self.yaml_path).segments), 3)
+
+        with open(self.yaml_path, "w") as f:
+            f.write(ASSETS_YAML.replace("  - [0x00D380, blast, 00D380.blast1, 1, 16, 16]\n", ""))
+        os.utime(self.yaml_path, ns=(0, 0))
+
+        self.assertEqual(len(load_assets(self.yaml_path).segments), 2)
+
+    def test_rebuild_on_stale_pickle(self):
+        load_assets(self.yaml_path)
+        # A pickled class that moved since fails with more than UnpicklingError
+        with mock.patch("pickle.load", side_effect=AttributeError("AssetIndex")):
+            index = load_assets(self.yaml_path)
+        self.assertEqual(len(index.segments), 3)
+
+        # Files of another version are compiled again
+        cache_dir = os.path.join(self.directory.name, "cache")
+        index_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        with open(index_path, "r+b") as f:
+            f.seek(8)
+            f.write(struct.pack(">I", INDEX_VERSION + 1))
+        with mock.patch("blastimation.index.compile_assets", wraps=compile_assets) as compile_fun:
+            self.assertEqual(len(load_assets(self.yaml_path).segments), 3)
+        compile_fun.assert_called_once()
@@ -0,0 +1,47 @@
+import unittest
+
+from blastimation.blast import Blast
+from blastimation.lut import luts, lut_addresses, lut_tables, add_lut, find_lut, get_last_lut, get_lut_row, \
+    get_lut_table, get_luts_in_range
+
+
+class TestLut(unittest.TestCase):
+    def tearDown(self):
+        luts[128].pop(0x1000, None)
+        lut_tables.pop(0x1000, None)
+
+    def test_lut_table_cache(self):
+        luts[128][0x1000] = bytes(range(128))
+        table = get_lut_table(Blast.BLAST4_IA16, 0x1000)
+        self.assertIs(table, get_lut_table(Blast.BLAST4_IA16, 0x1000))
+
+        # Same bytes from another buffer keep the table
+        luts[128][0x1000] = bytearray(range(128))
+        self.assertIs(table, get_lut_table(Blast.BLAST4_IA16, 0x1000))
+
+        luts[128][0x1000] = bytes(reversed(range(128)))
+        self.assertIsNot(table, get_lut_table(Blast.BLAST4_IA16, 0x1000))
+
+    def test_find_lut(self):
+        saved = {size: (dict(luts[size]), list(lut_addresses[size])) for size in luts}
+        try:
+            for size in luts:
+                luts[size].clear()
+                lut_addresses[size].clear()
+            for address in [0x3000, 0x1000, 0x2000]:
+                add_lut(address, bytes(256))
+            add_lut(0x1800, bytes(128))
+
+            self.assertEqual(lut_addresses[256], [0x1000, 0x2000, 0x3000])
+            self.assertEqual(get_last_lut(Blast.BLAST5_RGBA32), 0x3000)
+            self.assertEqual(find_lut(Blast.BLAST5_RGBA32, 0x0FFF), 0)
+            self.assertEqual(find_lut(Blast.BLAST5_RGBA32, 0x2000), 0x2000)
+            self.assertEqual(find_lut(Blast.BLAST5_RGBA32, 0x2FFF), 0x2000)
+            self.assertEqual(find_lut(Blast.BLAST4_IA16, 0x2FFF), 0x1800)
+            self.assertEqual(get_luts_in_range(256, 0x1001, 0x3000), [0x2000, 0x3000])
+            self.assertEqual(get_lut_row(256, 0x3000), 2)
+        finally:
+            for size, (lut_dict, addresses) in saved.items():
+                luts[size].clear()
+                luts[size].update(lut_dict)
+                lut_addresses[size][:] = addresses
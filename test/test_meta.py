@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from blastimation.blast import Blast
+from blastimation.comp import CompType
+from blastimation.meta import Meta
+from blastimation.rom import rom
+
+META_YAML = """composites:
+  TopBottom:
+    - [0x000100, 0x000200, Truck]
+  Animation:
+    - [0x000300, 0x000400, 0x000500]
+composite_animations:
+  RightLeft:
+    Dollar:
+    - [0x000600, 0x000700]
+    - [0x000800, 0x000900]
+"""
+
+
+class TestMeta(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, "meta.yaml"), "w") as f:
+            f.write(META_YAML)
+        self.environ = mock.patch.dict(os.environ, {"BLASTIMATION_CACHE": os.path.join(self.directory.name, "cache")})
+        self.environ.start()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+        addresses = list(range(0x100, 0xA00, 0x100))
+        rom.set_images(addresses, [Blast.BLAST2_RGBA32.value] * len(addresses), [0] * len(addresses))
+
+    def tearDown(self):
+        rom.set_images([], [], [])
+        os.chdir(self.cwd)
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def test_members(self):
+        meta = Meta()
+        truck, animation, dollar = meta.comps[0x100], meta.comps[0x300], meta.comps[0x600]
+        self.assertEqual(truck.name, "Truck")
+        self.assertEqual(dollar.type, CompType.AnimationComp)
+
+        self.assertEqual(meta.find_comp(0x200), (truck, 0))
+        self.assertEqual(meta.find_comp(0x500), (animation, 2))
+        self.assertEqual(meta.find_comp(0x900), (dollar, 1))
+        self.assertIsNone(meta.find_comp(0xA00))
+        self.assertEqual(sorted(meta.members), list(range(0x100, 0xA00, 0x100)))
@@ -0,0 +1,69 @@
+import unittest
+
+from PySide6.QtCore import QPersistentModelIndex, Qt
+
+from blastimation.blast import Blast
+from blastimation.models import COLUMN_LABELS, CatalogueModel, gui_cache
+
+
+class TestModels(unittest.TestCase):
+    def setUp(self):
+        self.model = CatalogueModel({"address": "Start", "blast": "Encoding", "width": "Width"})
+        self.model.set_rows({"address": [0x300, 0x100, 0x200, 0x400], "blast": [5, 1, 5, 2],
+                             "width": [16, 64, 32, 8], "height": [8, 8, 16, 32]},
+                            COLUMN_LABELS, None, lambda address: ("icon", "test", address))
+
+    def column(self, column: int) -> list:
+        return [self.model.data(self.model.index(row, column)) for row in range(self.model.rowCount())]
+
+    def test_sort(self):
+        self.assertEqual(self.model.headerData(2, Qt.Horizontal), "Width")
+        self.assertEqual(self.column(0), ["0x000100", "0x000200", "0x000300", "0x000400"])
+
+        selected = QPersistentModelIndex(self.model.index(2, 0))
+        self.model.sort(2, Qt.DescendingOrder)
+        self.assertEqual(self.column(2), [64, 32, 16, 8])
+        self.assertEqual(self.model.address(0), 0x100)
+        # Selections follow their rows
+        self.assertEqual(selected.row(), 2)
+        self.assertEqual(self.model.address(selected.row()), 0x300)
+
+    def test_filter(self):
+        self.model.sort(2)
+        self.model.set_filter({"blast": Blast.BLAST5_RGBA32.value})
+        self.assertEqual(self.column(1), ["BLAST5_RGBA32", "BLAST5_RGBA32"])
+        self.assertEqual(self.column(2), [16, 32])
+
+        # Columns that are not shown, and ones the model lacks
+        self.model.set_filter({"height": (None, 16), "frames": 1})
+        self.assertEqual(self.column(2), [16, 32, 64])
+
+        self.model.set_filter()
+        self.assertEqual(self.model.rowCount(), 4)
+
+    def test_sort_empty(self):
+        # Headers can be clicked before the rows are set
+        model = CatalogueModel({"address": "Start", "blast": "Encoding", "width": "Width"})
+        model.sort(2, Qt.DescendingOrder)
+        self.assertEqual(model.rowCount(), 0)
+
+    def test_icons(self):
+        requested = []
+        changed = []
+        self.model.request_icon = requested.append
+        self.model.dataChanged.connect(lambda top, bottom, roles: changed.append(top.row()))
+        self.model.sort(2)
+
+        # Missing icons are requested, set ones repaint their row
+        self.assertIsNone(self.model.data(self.model.index(1, 0), Qt.DecorationRole))
+        self.assertEqual(requested, [0x300])
+        gui_cache.put(("icon", "test", 0x300), "icon", 0)
+        self.model.refresh(0x300)
+        self.assertEqual(changed, [1])
+        self.assertEqual(self.model.data(self.model.index(1, 0), Qt.DecorationRole), "icon")
+
+        # Filtered out rows are not repainted
+        self.model.set_filter({"blast": Blast.BLAST1_RGBA16.value})
+        self.model.refresh(0x300)
+        self.assertEqual(changed, [1])
+        gui_cache.discard(("icon", "test", 0x300))
@@ -0,0 +1,84 @@
+import random
+import struct
+import unittest
+
+import numpy as np
+
+from blastimation.blast import Blast, blast_get_literal_invalid_bits, blast_literal_table, blast_lookup_table, \
+    decode_blast, decode_blast_lookup, make_plan
+from blastimation.pipeline import blast_literal_rgba_table, blast_rgba_table, render_indices, render_plan
+from blastimation.tex64 import parse_ia8, parse_rgba16, parse_rgba32
+from test.test_blast import random_encoded
+
+
+def reference_rgba(blast_type: Blast, decoded: bytes, width: int, height: int) -> bytes:
+    match blast_type:
+        case Blast.BLAST1_RGBA16:
+            return bytes(parse_rgba16(decoded, width, height, False, True))
+        case (Blast.BLAST3_IA8 | Blast.BLAST6_IA8):
+            ia = np.frombuffer(bytes(parse_ia8(decoded, width, height, False, True)), dtype=np.uint8)
+        case Blast.BLAST4_IA16:
+            rows = np.frombuffer(decoded, dtype=np.uint8)[:width * height * 2].reshape(height, -1)
+            ia = rows[::-1].reshape(-1)
+        case _:
+            return bytes(parse_rgba32(decoded, width, height, False, True))
+    return ia.reshape(-1, 2)[:, [0, 0, 0, 1]].tobytes()
+
+
+def aligned_encoded(seed: int, invalid_bits: int) -> bytes:
+    rng = random.Random(seed)
+    words = [rng.randrange(0x8000) & ~invalid_bits for _ in range(64)]
+    for i in range(2048):
+        if rng.random() < 0.3:
+            words.append(0x8000 | ((rng.randrange(0x400) & ~3) << 5) | rng.randrange(32))
+        else:
+            words.append(rng.randrange(0x8000) & ~invalid_bits)
+    return struct.pack(">%dH" % len(words), *words)
+
+
+class TestPipeline(unittest.TestCase):
+    def test_render_plan(self):
+        rng = random.Random(1)
+        for blast_type in Blast:
+            if blast_type == Blast.BLAST0:
+                continue
+            invalid_bits = blast_get_literal_invalid_bits(blast_type)
+            lut = struct.pack(">128H", *[rng.randrange(0x8000) for _ in range(128)])
+
+            for seed in range(4):
+                for encoded in [random_encoded(seed, invalid_bits=invalid_bits), aligned_encoded(seed, invalid_bits)]:
+                    match blast_type:
+                        case Blast.BLAST4_IA16:
+                            decoded = decode_blast_lookup(blast_type, encoded, lut[:128], use_tables=False)
+                            table = blast_lookup_table(blast_type, lut[:128])
+                            rgba_table = blast_rgba_table(blast_type, table)
+                        case Blast.BLAST5_RGBA32:
+                            decoded = decode_blast_lookup(blast_type, encoded, lut, use_tables=False)
+                            table = blast_lookup_table(blast_type, lut)
+                            rgba_table = blast_rgba_table(blast_type, table)
+                        case _:
+                            decoded = decode_blast(blast_type, encoded, use_tables=False)
+                            table = blast_literal_table(blast_type)
+                            rgba_table = blast_literal_rgba_table(blast_type)
+
+                    width = 32
+                    height = len(decoded) // (width * (4 if blast_type == Blast.BLAST1_RGBA16 else 8))
+                    rgba = render_plan(blast_type, make_plan(blast_type, encoded), table, rgba_table, width, height)
+
+                    self.assertEqual(rgba.shape, (height, width, 4))
+                    self.assertTrue(rgba.flags.c_contiguous)
+                    self.assertEqual(rgba.tobytes(), reference_rgba(blast_type, decoded, width, height),
+                                     blast_type.name)
+
+    def test_render_short_indices(self):
+        lut = struct.pack(">128H", *range(0x100, 0x180))
+        table = blast_lookup_table(Blast.BLAST4_IA16, lut)
+        rgba_table = blast_rgba_table(Blast.BLAST4_IA16, table)
+        indices = np.zeros(4, dtype=np.uint16)
+        rgba = render_indices(indices, rgba_table, 8, 2)
+
+        # Pixels past the stream are transparent, not LUT colour 0
+        self.assertEqual(rgba.shape, (2, 8, 4))
+        self.assertTrue(rgba.flags.c_contiguous)
+        np.testing.assert_array_equal(rgba[1], rgba_table[indices].reshape(8, 4))
+        self.assertFalse(rgba[0].any())
@@ -0,0 +1,53 @@
+import threading
+import unittest
+
+import numpy as np
+
+from blastimation.blast import Blast
+from blastimation.image import BlastImage
+from blastimation.playback import FrameRing, scale_rgba
+
+
+class TestPlayback(unittest.TestCase):
+    def test_scale_rgba(self):
+        rgba = np.arange(2 * 4 * 4, dtype=np.uint8).reshape(2, 4, 4)
+        scaled = scale_rgba(rgba, 100, 100)
+        # Keeps the aspect ratio
+        self.assertEqual(scaled.shape, (50, 100, 4))
+        self.assertTrue(scaled.flags.c_contiguous)
+        self.assertTrue(np.array_equal(scaled[::25, ::25], rgba))
+
+    def test_frame_ring(self):
+        frames = []
+        for i in range(5):
+            image = BlastImage(Blast.BLAST2_RGBA32, 0x100 * i, b"\0\0", 2, 2)
+            image.set_rgba(np.full((2, 2, 4), i, dtype=np.uint8))
+            frames.append(image)
+
+        release = threading.Event()
+
+        def get_frame(frame: int) -> BlastImage:
+            release.wait()
+            return frames[frame]
+
+        ring = FrameRing(get_frame, len(frames), 4, 4, start=3, budget=3 * 4 * 4 * 4)
+        self.assertEqual(ring.capacity, 3)
+        # Nothing rendered yet
+        self.assertIsNone(ring.next_frame())
+        self.assertEqual(ring.dropped, 1)
+
+        release.set()
+        shown = []
+        while len(shown) < 7:
+            frame = ring.next_frame()
+            if frame:
+                self.assertLessEqual(len(ring.frames), ring.capacity)
+                index, image, scaled = frame
+                self.assertIs(image, frames[index])
+                self.assertTrue(np.all(scaled == index))
+                shown.append(index)
+        ring.stop()
+
+        self.assertEqual(shown, [3, 4, 0, 1, 2, 3, 4])
+        self.assertEqual(ring.shown, 7)
+        self.assertFalse(ring.thread.is_alive())
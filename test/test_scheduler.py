@@ -0,0 +1,76 @@
+import threading
+import unittest
+
+from blastimation.scheduler import DecodeScheduler, PRIORITY_REST, PRIORITY_SELECTED, PRIORITY_VISIBLE
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.done = []
+        self.finished = threading.Event()
+        # Holds the single worker on its first job while the rest is queued
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+        def work(key):
+            if key == "first":
+                self.started.set()
+                self.release.wait()
+            return key * 2
+
+        def done(key, result):
+            self.done.append((key, result))
+            if key == "last":
+                self.finished.set()
+
+        self.scheduler = DecodeScheduler(work, done, 1)
+        self.scheduler.schedule(["first"], PRIORITY_REST)
+        self.assertTrue(self.started.wait(5))
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def finish(self) -> list:
+        self.scheduler.schedule(["last"], PRIORITY_REST + 1)
+        self.release.set()
+        self.assertTrue(self.finished.wait(5))
+        return [key for key, _ in self.done]
+
+    def test_priority(self):
+        self.scheduler.schedule(["c", "d"], PRIORITY_REST)
+        self.scheduler.schedule(["a", "b"], PRIORITY_VISIBLE)
+        # Raised, never lowered
+        self.scheduler.schedule(["d"], PRIORITY_SELECTED)
+        self.scheduler.schedule(["a"], PRIORITY_REST)
+        self.assertEqual(self.finish(), ["first", "d", "a", "b", "c", "last"])
+        self.assertEqual(self.done[1], ("d", "dd"))
+
+    def test_cancel(self):
+        self.scheduler.schedule(["c"], PRIORITY_REST)
+        self.scheduler.schedule(["a", "b"], PRIORITY_VISIBLE)
+        self.scheduler.cancel(PRIORITY_VISIBLE)
+        self.scheduler.schedule(["b"], PRIORITY_VISIBLE)
+        self.assertEqual(self.finish(), ["first", "b", "c", "last"])
+
+    def test_cancel_keeps_fallback(self):
+        # Raised to visible, then back to the background on cancel
+        self.scheduler.schedule(["x", "y"], PRIORITY_REST)
+        self.scheduler.schedule(["x"], PRIORITY_VISIBLE)
+        self.scheduler.cancel(PRIORITY_VISIBLE)
+        self.assertEqual(self.finish(), ["first", "x", "y", "last"])
+
+    def test_reschedule_from_done(self):
+        # A key scheduled again by done runs again
+        again = threading.Event()
+
+        def done(key, result):
+            self.done.append((key, result))
+            if len(self.done) == 1:
+                self.scheduler.schedule([key], PRIORITY_VISIBLE)
+            else:
+                again.set()
+
+        self.scheduler.done = done
+        self.release.set()
+        self.assertTrue(again.wait(5))
+        self.assertEqual(self.done, [("first", "firstfirst"), ("first", "firstfirst")])
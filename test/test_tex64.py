@@ -0,0 +1,31 @@
+import random
+import unittest
+
+import numpy as np
+
+from blastimation.tex64 import parse_rgba16, parse_rgba16_table, parse_ia8, parse_ia8_rgba, parse_rgba32, \
+    parse_rgba32_array
+
+
+class TestTex64(unittest.TestCase):
+    def test_parse_tables(self):
+        rng = random.Random(0)
+        for width, height in [(4, 2), (16, 32), (64, 64)]:
+            for flip_h in [False, True]:
+                for flip_v in [False, True]:
+                    args = (width, height, flip_h, flip_v)
+
+                    data = rng.randbytes(width * height * 2)
+                    self.assertEqual(bytes(parse_rgba16(data, *args)), parse_rgba16_table(data, *args).tobytes())
+
+                    data = rng.randbytes(width * height)
+                    ia = np.frombuffer(bytes(parse_ia8(data, *args)), dtype=np.uint8).reshape(-1, 2)
+                    self.assertEqual(ia[:, [0, 0, 0, 1]].tobytes(), parse_ia8_rgba(data, *args).tobytes())
+
+                    data = rng.randbytes(width * height * 4)
+                    self.assertEqual(bytes(parse_rgba32(data, *args)), parse_rgba32_array(data, *args).tobytes())
+
+    def test_parse_rgba16_short(self):
+        data = bytes(range(60))
+        self.assertEqual(bytes(parse_rgba16(data, 8, 4, False, True)),
+                         parse_rgba16_table(data, 8, 4, False, True).tobytes())